@@ -0,0 +1,416 @@
+"""Offline benchmark for the translator client, against a local stub Ollama server.
+
+The stub speaks the /api/tags and /api/generate NDJSON protocol with a
+configurable token rate, chunk size, latency and failure rate, so the
+client's own overhead can be measured without a real model:
+
+    python ollama_translator_bench.py --paragraphs 200 --token-rate 400 --mode all
+
+Headless mode drives translate_text and the /api/tags request directly.
+Tk mode opens the real window (a display is required) and goes through
+start_translation and refresh_available_models, measuring time to first
+render and how far the Tk event queue falls behind.
+
+Startup mode launches the application as a separate process, either the
+script or a PyInstaller build (--executable dist/ollama_translator_gui), and
+checks the time until its window is drawn against a budget:
+
+    python ollama_translator_bench.py --mode startup --executable dist/ollama_translator_gui --startup-budget-ms 1500
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keep the benchmark away from the user's translation memory and metrics
+# (read by the core module when it is imported in main()).
+_BENCH_STATE_DIR = tempfile.mkdtemp(prefix="ollama_translator_bench_")
+os.environ.setdefault("OLLAMA_TRANSLATOR_CACHE", os.path.join(_BENCH_STATE_DIR, "translation_cache.sqlite3"))
+os.environ.setdefault("OLLAMA_TRANSLATOR_METRICS_DIR", _BENCH_STATE_DIR)
+
+STUB_MODEL = "stub:latest"
+SAMPLE_PARAGRAPH = ("Der schnelle braune Fuchs springt über den faulen Hund. "
+                    "Dieser Satz enthält viele Wörter, die übersetzt werden müssen.")
+
+# --- Stub Server ---
+def _prompt_tokens(text):
+    return (len(text) + 3) // 4 # Same rule of thumb as the client's estimate_tokens()
+
+
+class StubOllamaServer:
+    """Minimal threaded stand-in for an Ollama server.
+
+    token_rate is tokens per second per stream, chunk_tokens the number of
+    tokens per NDJSON line, latency the delay before the first line and
+    failure_rate the share of generate requests that fail (half with a 500
+    status, half by dropping the connection mid-stream). /api/chat imitates a
+    prefix cache: a system message seen before is not counted in
+    prompt_eval_count. Models that served a request are listed in /api/ps
+    (each taking model_size bytes) until a keep_alive of 0 unloads them.
+    """
+    def __init__(self, token_rate=200.0, chunk_tokens=1, latency=0.0, failure_rate=0.0, models=5, seed=0):
+        self.token_rate = token_rate
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.models = [STUB_MODEL] + [f"stub-{i}:latest" for i in range(1, models)]
+        self.random = random.Random(seed)
+        self.generate_requests = 0
+        self.failures = 0
+        self.seen_prefixes = set()
+        self.num_ctx = 2048
+        self.context_length = 8192
+        self.model_size = 4 * 1024 ** 3
+        self.resident = {} # model -> expiry time
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/api"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _should_fail(self):
+        with self._lock:
+            self.generate_requests += 1
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                self.failures += 1
+                return self.random.choice(["status", "drop"])
+        return None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True # Otherwise small writes wait for delayed ACKs
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, obj):
+                body = json.dumps(obj).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode('utf-8')
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    details = {"family": "stub", "parameter_size": "7B", "quantization_level": "Q4_0"}
+                    self._send_json(200, {"models": [{"name": name, "size": stub.model_size, "details": details}
+                                                     for name in stub.models]})
+                elif self.path.rstrip("/") == "/api/ps":
+                    with stub._lock:
+                        resident = sorted(stub.resident.items())
+                    self._send_json(200, {"models": [
+                        {"name": name, "model": name, "size": stub.model_size, "size_vram": stub.model_size,
+                         "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires))}
+                        for name, expires in resident]})
+                else:
+                    self._send_json(200, {"status": "Ollama is running"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/show":
+                    self._send_json(200, {"parameters": f"num_ctx {stub.num_ctx}",
+                                          "model_info": {"general.architecture": "stub",
+                                                         "stub.context_length": stub.context_length}})
+                    return
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                with stub._lock:
+                    if request.get("keep_alive") in (0, "0"):
+                        stub.resident.pop(request.get("model"), None)
+                    else:
+                        stub.resident[request.get("model")] = time.time() + 300
+                if not request.get("prompt") and not request.get("messages"):
+                    self._send_json(200, {"model": request.get("model"), "done": True, "done_reason": "load"})
+                    return
+                failure = stub._should_fail()
+                if failure == "status":
+                    self._send_json(500, {"error": "injected failure"})
+                    return
+                self._stream(request, failure == "drop")
+
+            def _stream(self, request, drop):
+                started = time.perf_counter()
+                # Answer with about as many tokens as the prompt has words
+                chat = "messages" in request
+                if chat:
+                    messages = request["messages"]
+                    words = messages[-1]["content"].split()
+                    prompt_tokens = sum(_prompt_tokens(m["content"]) for m in messages)
+                    if messages[0]["role"] == "system":
+                        with stub._lock:
+                            if messages[0]["content"] in stub.seen_prefixes:
+                                prompt_tokens -= _prompt_tokens(messages[0]["content"])
+                            stub.seen_prefixes.add(messages[0]["content"])
+                else:
+                    words = request["prompt"].split()
+                    prompt_tokens = _prompt_tokens(request["prompt"])
+                # Stop early like Ollama does at num_predict
+                num_predict = request.get("options", {}).get("num_predict")
+                done_reason = "stop"
+                if num_predict is not None and num_predict >= 0 and len(words) > num_predict:
+                    words = words[:num_predict]
+                    done_reason = "length"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                if stub.latency:
+                    time.sleep(stub.latency)
+                interval = stub.chunk_tokens / stub.token_rate if stub.token_rate else 0
+                try:
+                    for i in range(0, len(words), stub.chunk_tokens):
+                        if drop and i >= len(words) // 2:
+                            self.close_connection = True
+                            return # End without the terminating chunk
+                        text = " ".join(words[i:i + stub.chunk_tokens]) + " "
+                        if chat:
+                            self._write_chunk({"model": request["model"], "done": False,
+                                               "message": {"role": "assistant", "content": text}})
+                        else:
+                            self._write_chunk({"model": request["model"], "response": text, "done": False})
+                        if interval:
+                            time.sleep(interval)
+                    elapsed_ns = int((time.perf_counter() - started) * 1e9)
+                    self._write_chunk({"model": request["model"], "response": "", "done": True,
+                                       "done_reason": done_reason, "total_duration": elapsed_ns, "load_duration": 0,
+                                       "prompt_eval_count": prompt_tokens, "prompt_eval_duration": 0,
+                                       "eval_count": len(words), "eval_duration": elapsed_ns})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # Client cancelled
+
+        return Handler
+
+# --- Measurements ---
+def make_document(paragraphs):
+    return "\n\n".join(f"{i}. {SAMPLE_PARAGRAPH}" for i in range(paragraphs))
+
+def bench_headless(core, document, workers):
+    """Run translate_text without any UI and report client-side throughput."""
+    tokens = []
+    first = []
+    controller = core.AbortController()
+    metrics = core.TranslationMetrics(STUB_MODEL, "de-en")
+
+    def on_text(text):
+        if not first:
+            first.append(time.perf_counter())
+        tokens.append(text)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        core.translate_text(document, STUB_MODEL, "de-en", on_text, controller, workers=workers, metrics=metrics)
+    except Exception as e:
+        error = str(e)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    list_times = []
+    for _ in range(20):
+        list_started = time.perf_counter()
+        core.get_client().get("/tags", read_timeout=core.LIST_READ_TIMEOUT).json()
+        list_times.append(time.perf_counter() - list_started)
+
+    return {
+        "mode": "headless",
+        "error": error,
+        "wall_time_s": round(elapsed, 3),
+        "chunks_received": len(tokens),
+        "backend": core.PROMPT_BACKEND,
+        "prompt_tokens_saved": metrics.prompt_tokens_saved,
+        "tokens_per_s": round(metrics.eval_count / elapsed, 1) if elapsed else None,
+        "ttft_s": round(first[0] - started, 4) if first else None,
+        "peak_memory_kib": peak // 1024,
+        "model_list_ms": round(1000 * sorted(list_times)[len(list_times) // 2], 2),
+        "http": core.get_client().connection_stats(),
+    }
+
+def bench_tk(document, timeout=300):
+    """Drive the real window: refresh the model list, translate, and watch the event loop."""
+    import tkinter as tk
+    import ollama_translator_gui as gui
+
+    root = tk.Tk()
+    app = gui.OllamaTranslatorApp(root)
+    app.translation_cache = None # Measure generation, not the translation memory
+
+    def pending_after_callbacks():
+        return len(root.tk.splitlist(root.tk.call('after', 'info')))
+
+    # Model list: refresh_available_models -> _fetch_models_thread -> listbox
+    list_started = time.perf_counter()
+    app.refresh_available_models()
+    while app.available_models_listbox.get(0) == "Loading..." and time.perf_counter() - list_started < timeout:
+        root.update()
+    model_list_ms = 1000 * (time.perf_counter() - list_started)
+
+    app.active_model = STUB_MODEL
+    app.input_text.insert("1.0", document)
+    tracemalloc.start()
+    started = time.perf_counter()
+    app.start_translation()
+    first_render = None
+    max_backlog = 0
+    max_lag = 0.0
+    chunks = tokens = 0
+    while time.perf_counter() - started < timeout:
+        tick = time.perf_counter()
+        root.update()
+        max_lag = max(max_lag, time.perf_counter() - tick)
+        max_backlog = max(max_backlog, pending_after_callbacks())
+        job = app.display_job
+        if job is not None:
+            chunks = job.metrics.streamed_chunks
+            tokens = job.metrics.eval_count
+            if first_render is None and not app._awaiting_output:
+                first_render = time.perf_counter() - started
+        elif app.scheduler.jobs() and all(j.finished for j in app.scheduler.jobs()):
+            break
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    error = app.error_label.cget("text") or None
+    root.destroy()
+
+    return {
+        "mode": "tk",
+        "error": error,
+        "wall_time_s": round(elapsed, 3),
+        "chunks_received": chunks,
+        "tokens_per_s": round(tokens / elapsed, 1) if elapsed else None,
+        "time_to_first_render_s": round(first_render, 4) if first_render is not None else None,
+        "max_ui_backlog": max_backlog,
+        "max_event_loop_stall_ms": round(1000 * max_lag, 2),
+        "peak_memory_kib": peak // 1024,
+        "model_list_ms": round(model_list_ms, 2),
+    }
+
+# The TclError messages of Tk starting without a display; only these make a
+# tk or startup run count as skipped, any other failure is an error
+NO_DISPLAY_MESSAGES = ("no display name", "couldn't connect to display")
+
+def is_no_display_error(message):
+    return "TclError" in message and any(text in message for text in NO_DISPLAY_MESSAGES)
+
+def bench_startup(command, base_url, budget_ms, timeout=60):
+    """Launch the application and time its startup until the model list has loaded."""
+    env = dict(os.environ, OLLAMA_API_BASE_URL=base_url, OLLAMA_TRANSLATOR_EXIT_AFTER_STARTUP="1",
+               OLLAMA_TRANSLATOR_LAUNCH_TIME=repr(time.time()))
+    started = time.perf_counter()
+    try:
+        completed = subprocess.run(command, env=env, timeout=timeout, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+    except subprocess.TimeoutExpired:
+        return {"mode": "startup", "error": f"did not finish starting within {timeout} s"}
+    except OSError as e:
+        return {"mode": "startup", "error": f"could not launch {command[0]}: {e}"}
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines() or ["exit code %d" % completed.returncode]
+        if is_no_display_error(lines[-1]):
+            return {"mode": "startup", "error": f"skipped: {lines[-1]}"}
+        return {"mode": "startup", "error": f"exited with code {completed.returncode}: {lines[-1]}"}
+
+    startup = {}
+    try:
+        with open(os.path.join(os.environ["OLLAMA_TRANSLATOR_METRICS_DIR"], "startup.jsonl"), encoding='utf-8') as f:
+            for line in f:
+                startup = json.loads(line) # The run that just finished is last
+    except (OSError, ValueError) as e:
+        return {"mode": "startup", "error": f"no startup record: {e}"}
+    window_ms = 1000 * startup["window_s"] if startup.get("window_s") is not None else None
+    within_budget = window_ms is not None and window_ms <= budget_ms
+    return {
+        "mode": "startup",
+        "error": None if within_budget else f"window took {window_ms} ms, budget {budget_ms} ms",
+        "command": " ".join(command),
+        "frozen": startup.get("frozen"),
+        "window_ms": round(window_ms, 1) if window_ms is not None else None,
+        "server_ready_ms": round(1000 * startup["server_ready_s"], 1) if startup.get("server_ready_s") is not None else None,
+        "process_s": round(elapsed, 3),
+        "budget_ms": budget_ms,
+        "within_budget": within_budget,
+    }
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the translator client against a stub Ollama server.")
+    parser.add_argument("--mode", choices=["headless", "tk", "startup", "all"], default="headless")
+    parser.add_argument("--paragraphs", type=int, default=100, help="Paragraphs in the generated document (default: 100)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Tokens per second per stream, 0 for unlimited (default: 200)")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="Tokens per NDJSON line (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first streamed line (default: 0)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of generate requests that fail (default: 0)")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent segment requests (default: OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--executable", help="Application to launch in startup mode, e.g. a PyInstaller build (default: the script)")
+    parser.add_argument("--startup-budget-ms", type=int, default=1500, help="Longest acceptable time until the window is drawn (default: 1500)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stub = StubOllamaServer(args.token_rate, args.chunk_tokens, args.latency, args.failure_rate).start()
+    os.environ["OLLAMA_API_BASE_URL"] = stub.url
+    import ollama_translator_core as core # Reads the settings above
+
+    document = make_document(args.paragraphs)
+    results = []
+    try:
+        if args.mode in ("headless", "all"):
+            results.append(bench_headless(core, document, args.workers or core.MAX_PARALLEL_REQUESTS))
+        if args.mode in ("tk", "all"):
+            try:
+                results.append(bench_tk(document))
+            except Exception as e:
+                message = f"{type(e).__name__}: {e}"
+                results.append({"mode": "tk", "error": f"skipped: {message}" if is_no_display_error(message) else message})
+        if args.mode in ("startup", "all"):
+            command = [args.executable] if args.executable else [
+                sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ollama_translator_gui.py")]
+            results.append(bench_startup(command, stub.url, args.startup_budget_ms))
+    finally:
+        stub.stop()
+
+    for result in results:
+        result["stub"] = {"token_rate": args.token_rate, "chunk_tokens": args.chunk_tokens, "latency": args.latency,
+                          "failure_rate": args.failure_rate, "generate_requests": stub.generate_requests,
+                          "injected_failures": stub.failures}
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"[{result['mode']}]")
+            for key, value in result.items():
+                if key != "mode":
+                    print(f"  {key}: {value}")
+    return 1 if any(result.get("error") and not str(result["error"]).startswith("skipped") for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
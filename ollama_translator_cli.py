@@ -0,0 +1,164 @@
+"""Headless batch translation of text files through Ollama.
+
+Translates files, directories and glob patterns without a display, using the
+same prompts, segmentation and translation memory as the GUI. Files are read
+and written incrementally, so their size does not affect memory use. Finished
+destination files are skipped on the next run, so interrupted batches can
+simply be restarted.
+
+Example:
+    python ollama_translator_cli.py --model llama3 --direction de-en --jobs 4 docs/ "notes/**/*.txt"
+"""
+import argparse
+import glob
+import os
+import sys
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from ollama_translator_core import (MAX_PARALLEL_REQUESTS, MODEL_KEEP_ALIVE, AbortController, MetricsRecorder,
+                                    TranslationCache, TranslationMetrics, format_metrics, get_client,
+                                    get_endpoint_pool, get_model_manager, load_model, set_endpoints,
+                                    translate_file)
+
+DEFAULT_PATTERN = "*.txt"
+
+def collect_inputs(paths, pattern=DEFAULT_PATTERN):
+    """Expand files, directories (searched recursively for pattern) and globs into (source, base_dir) pairs."""
+    inputs = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            base = path
+            matches = glob.glob(os.path.join(glob.escape(path), "**", pattern), recursive=True)
+        elif os.path.isfile(path):
+            base = os.path.dirname(path)
+            matches = [path]
+        else:
+            base = None
+            matches = glob.glob(path, recursive=True)
+        for match in sorted(matches):
+            source = os.path.abspath(match)
+            if os.path.isfile(source) and source not in seen:
+                seen.add(source)
+                inputs.append((source, os.path.abspath(base or os.path.dirname(match))))
+    return inputs
+
+def destination_for(source, base_dir, direction, output_dir=None):
+    # report.txt -> report.en.txt, mirrored below output_dir when one is given
+    target_lang = direction.split("-")[-1]
+    stem, ext = os.path.splitext(source)
+    if output_dir:
+        stem = os.path.join(os.path.abspath(output_dir), os.path.relpath(stem, base_dir))
+    return f"{stem}.{target_lang}{ext or '.txt'}"
+
+def is_translation_output(path, direction):
+    # Outputs of an earlier run sit next to their sources and match the same pattern
+    target_lang = direction.split("-")[-1]
+    return os.path.splitext(os.path.splitext(path)[0])[1] == f".{target_lang}"
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Translate text files with a local Ollama model, without the GUI.")
+    parser.add_argument("paths", nargs="+", help="Files, directories or glob patterns to translate")
+    parser.add_argument("-m", "--model", required=True, help="Ollama model name, e.g. llama3:latest")
+    parser.add_argument("-d", "--direction", default="de-en", choices=["de-en", "en-de"], help="Translation direction (default: de-en)")
+    parser.add_argument("-o", "--output-dir", help="Write translations here instead of next to the source files")
+    parser.add_argument("-p", "--pattern", default=DEFAULT_PATTERN, help=f"File pattern used inside directories (default: {DEFAULT_PATTERN})")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Number of files translated concurrently (default: 2)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help=f"Concurrent segment requests per file (default: {MAX_PARALLEL_REQUESTS} per healthy endpoint)")
+    parser.add_argument("-e", "--endpoint", action="append", dest="endpoints", metavar="URL",
+                        help="Ollama server to use, e.g. http://gpu1:11434; repeat to spread requests over several "
+                             "(default: OLLAMA_ENDPOINTS or OLLAMA_API_BASE_URL)")
+    parser.add_argument("--keep-alive", default=MODEL_KEEP_ALIVE,
+                        help=f"How long the model stays loaded after the last request, e.g. 5m, -1, 0 (default: {MODEL_KEEP_ALIVE})")
+    parser.add_argument("--force", action="store_true", help="Translate again even if the destination already exists")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the translation memory")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    jobs = []
+    for source, base_dir in collect_inputs(args.paths, args.pattern):
+        destination = destination_for(source, base_dir, args.direction, args.output_dir)
+        if is_translation_output(source, args.direction):
+            continue
+        if os.path.exists(destination) and not args.force:
+            print(f"Skipping {source} (already translated)")
+            continue
+        jobs.append((source, destination))
+    if not jobs:
+        print("Nothing to translate.")
+        return 0
+
+    endpoint_pool = set_endpoints(args.endpoints) if args.endpoints else get_endpoint_pool()
+    endpoint_pool.refresh()
+    if not any(endpoint.healthy for endpoint in endpoint_pool.endpoints):
+        print("Could not connect to any Ollama endpoint.", file=sys.stderr)
+        return 1
+
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = TranslationCache()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Translation cache disabled: {e}", file=sys.stderr)
+
+    # Load the model once up front instead of letting the first files race the cold start
+    try:
+        get_model_manager().make_room(args.model) # Only unloads anything under OLLAMA_TRANSLATOR_MEMORY_BUDGET_GB
+        load_model(args.model, args.keep_alive)
+    except requests.exceptions.RequestException as e:
+        print(f"Could not preload model {args.model}: {e}", file=sys.stderr)
+
+    # One controller per file, so a failed request only cancels the rest of its own file
+    controllers = []
+    recorder = MetricsRecorder()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {}
+        for source, destination in jobs:
+            controller = AbortController()
+            controllers.append(controller)
+            metrics = TranslationMetrics(args.model, args.direction)
+            future = pool.submit(translate_file, source, destination, args.model, args.direction,
+                                 controller, cache, args.workers, metrics, args.keep_alive)
+            futures[future] = (source, destination, metrics)
+        try:
+            for future in as_completed(futures):
+                source, destination, metrics = futures[future]
+                try:
+                    if future.result():
+                        metrics.finish("ok")
+                        print(f"Translated {source} -> {destination} ({format_metrics(metrics.summary())})")
+                    else:
+                        failures += 1
+                        metrics.finish("cancelled")
+                        print(f"Cancelled {source} (partial output in {destination}.part)", file=sys.stderr)
+                except (requests.exceptions.RequestException, OSError, UnicodeDecodeError) as e:
+                    failures += 1
+                    metrics.finish("error")
+                    print(f"Failed {source}: {e}", file=sys.stderr)
+                try:
+                    recorder.record(metrics.summary())
+                except OSError as e:
+                    print(f"Could not write metrics: {e}", file=sys.stderr)
+        except KeyboardInterrupt:
+            for controller in controllers:
+                controller.abort() # Closes the open streams so the server stops generating
+            print("Interrupted, cancelling in-flight requests...", file=sys.stderr)
+            return 130
+
+    if cache:
+        cache.evict()
+        print(f"Translation cache: {cache.stats()}")
+    print(f"HTTP connections: {get_client().connection_stats()}")
+    if len(endpoint_pool.endpoints) > 1:
+        print("Endpoints: " + "; ".join(endpoint_pool.describe()))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
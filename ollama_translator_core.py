@@ -0,0 +1,2016 @@
+import importlib.util
+import sys
+import threading
+import json
+import os
+import re
+import sqlite3
+import hashlib
+import heapq
+import bisect
+import difflib
+import itertools
+import socket
+import time
+from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import subprocess
+
+def _lazy_import(name):
+    # The module is only executed on first attribute access, keeping it off the
+    # startup path (requests and urllib3 take longer to import than the rest of
+    # the application together). PyInstaller needs it listed in hiddenimports.
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+requests = _lazy_import("requests")
+
+# Default Ollama API endpoint
+OLLAMA_API_BASE_URL = os.environ.get("OLLAMA_API_BASE_URL", "http://localhost:11434/api")
+
+# --- Server Startup Settings ---
+# A freshly started `ollama serve` is polled with exponential backoff, from
+# SERVER_POLL_INITIAL_DELAY up to SERVER_POLL_MAX_DELAY seconds between
+# attempts, for at most SERVER_START_TIMEOUT seconds.
+SERVER_START_TIMEOUT = 30
+SERVER_POLL_INITIAL_DELAY = 0.1
+SERVER_POLL_MAX_DELAY = 2.0
+
+# --- Endpoint Pool Settings ---
+# Comma-separated Ollama servers to spread requests over (defaults to the one
+# above). Each is probed every HEALTH_CHECK_INTERVAL seconds; a server whose
+# connection fails is taken out of rotation for at least EJECT_SECONDS.
+OLLAMA_ENDPOINTS = [url for url in os.environ.get("OLLAMA_ENDPOINTS", "").split(",") if url.strip()]
+HEALTH_CHECK_INTERVAL = 15
+EJECT_SECONDS = 30
+
+# --- Model Manager Settings ---
+# Loaded models are read from /api/ps every PS_POLL_INTERVAL seconds. Above
+# 0, activating a model first unloads the least recently used loaded models
+# until it fits into this many GB of memory (RAM plus VRAM) on each server.
+MODEL_MEMORY_BUDGET_GB = float(os.environ.get("OLLAMA_TRANSLATOR_MEMORY_BUDGET_GB") or 0)
+PS_POLL_INTERVAL = 5
+# Expiry times further out than this mean the model is kept loaded (keep_alive -1)
+KEEP_LOADED_SECONDS = 365 * 24 * 3600
+
+# --- HTTP Client Settings ---
+# Connect timeouts are short; the read timeout bounds the gap between streamed
+# chunks, so a stalled server cannot hang a worker forever.
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 120
+LIST_READ_TIMEOUT = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.3
+
+# --- Model Residency Settings ---
+# How long Ollama keeps a model loaded after its last request ("30m", "2h",
+# seconds as a number, -1 to keep it loaded, 0 to unload immediately).
+# Loading a large model from disk can take minutes.
+MODEL_KEEP_ALIVE = os.environ.get("OLLAMA_TRANSLATOR_KEEP_ALIVE", "30m")
+MODEL_LOAD_TIMEOUT = 300
+
+# --- Prompting Settings ---
+# "chat" sends a fixed system prompt per direction to /api/chat, so every
+# segment's prompt starts with the same tokens and the server can reuse their
+# KV cache; "generate" glues the instruction onto the text for /api/generate.
+PROMPT_BACKEND = os.environ.get("OLLAMA_TRANSLATOR_BACKEND", "chat")
+# Above 0, the previous segment and its translation are sent along as an
+# earlier exchange if they fit in this many tokens (chat backend only). The
+# translation has to be known already: segments of a new text are translated
+# concurrently, so this mostly applies when an edited text is re-translated
+# (or with a single worker), not on the first run.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("OLLAMA_TRANSLATOR_CONTEXT_TOKENS", "0"))
+CHARS_PER_TOKEN = 4 # Rough average for German and English text
+
+# --- Context Window Settings ---
+# Planned with when /api/show does not tell the model's num_ctx. The server
+# then uses its own default window (OLLAMA_CONTEXT_LENGTH, at least this on
+# current versions), so requests that fit do not set num_ctx at all.
+DEFAULT_NUM_CTX = 2048
+# num_predict allows this many output tokens per source token, plus the
+# margin; a translation that needs more is treated as a runaway generation.
+OUTPUT_TOKEN_RATIO = 2.0
+NUM_PREDICT_MARGIN = 64
+# Chat template tokens around the messages, on top of their estimated size
+PROMPT_TEMPLATE_TOKENS = 32
+
+# --- Segmentation Settings ---
+# Inputs are split into paragraph segments (long paragraphs into pieces of at
+# most this many characters) and translated concurrently. The worker count
+# follows the server's parallel slots.
+MAX_SEGMENT_CHARS = 1500
+MAX_PARALLEL_REQUESTS = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "4")))
+
+PARAGRAPH_BREAK_RE = re.compile(r'(\n[ \t]*\n\s*)')
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?\u2026])(\s+)')
+
+# Files translated to files are read in blocks of about this many characters
+FILE_BLOCK_CHARS = 64 * 1024
+
+# --- Masking Settings ---
+# Code, URLs, e-mail addresses, markup and long numbers are replaced by
+# placeholders like {{1}} before a segment is sent, and put back into the
+# streamed translation. Segments with nothing left to translate are not sent
+# at all. Set OLLAMA_TRANSLATOR_MASKING=0 to send everything verbatim.
+MASK_SPANS = os.environ.get("OLLAMA_TRANSLATOR_MASKING", "1") != "0"
+MASK_RE = re.compile(
+    r'(?P<always>```.*?```|\{\{\d+\}\})' # Fenced code blocks and text that looks like a placeholder
+    r'|`[^`\n]+`' # Inline code
+    r'|(?:https?|ftp)://[^\s<>"\'()\[\]]*[^\s<>"\'()\[\].,;:!?]' # URLs, without trailing punctuation
+    r'|[\w.+-]+@[\w-]+(?:\.[\w-]+)+' # E-mail addresses
+    r'|<!--.*?-->|</?[A-Za-z][^<>\n]*>' # HTML/XML comments and tags
+    r'|&(?:[A-Za-z]+|#\d+|#x[0-9A-Fa-f]+);' # HTML entities
+    r'|(?<![\w.,])\d[\d.,:/-]*\d(?!\w)', # Numbers, dates, versions
+    re.DOTALL)
+PLACEHOLDER_RE = re.compile(r'\{\{(\d+)\}\}')
+# The end of a streamed piece that may be the start of a placeholder
+PARTIAL_PLACEHOLDER_RE = re.compile(r'\{(?:\{(?:\d+\}?)?)?$')
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+# --- Batching Settings ---
+# translate_batch() sends up to BATCH_MAX_ITEMS short texts (single
+# paragraphs of at most BATCH_MAX_CHARS) as one numbered request and splits
+# the reply on the markers again.
+BATCH_MAX_ITEMS = 8
+BATCH_MAX_CHARS = 400
+BATCH_MARKER_RE = re.compile(r'\[(\d+)\]\s*')
+
+# --- Translation Memory Settings ---
+# Finished segment translations are kept in a local SQLite database so that
+# repeated text is served without another generation.
+TRANSLATION_CACHE_PATH = os.environ.get(
+    "OLLAMA_TRANSLATOR_CACHE",
+    os.path.join(os.path.expanduser("~"), ".ollama_translator", "translation_cache.sqlite3"))
+CACHE_MAX_ENTRIES = 50000
+CACHE_MAX_AGE_DAYS = 90
+
+# --- Metrics Settings ---
+# Every run is appended to metrics.jsonl and summarized in metrics.prom
+# (Prometheus text format) in this directory.
+METRICS_DIR = os.environ.get(
+    "OLLAMA_TRANSLATOR_METRICS_DIR",
+    os.path.join(os.path.expanduser("~"), ".ollama_translator"))
+
+# --- HTTP Client ---
+class OllamaClient:
+    """Shared keep-alive HTTP client for the Ollama API.
+
+    Connections are pooled per host and reused across requests and threads;
+    there is a pool for every configured endpoint, so spreading requests over
+    them does not evict another host's kept-alive connections. Failed
+    connection attempts are retried with backoff for every method, since
+    nothing has reached the server yet; idempotent GETs are also retried on
+    502/503/504.
+    """
+    def __init__(self, base_url=None, pool_size=None, retries=HTTP_RETRIES,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.base_url = base_url or OLLAMA_API_BASE_URL
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        pool_size = pool_size or max(10, MAX_PARALLEL_REQUESTS * 4)
+        self._pool_size = pool_size
+        # First use of requests; get_client() creates the client under its lock,
+        # so the deferred import runs once even with several threads starting up.
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET", "HEAD"]),
+                      backoff_factor=HTTP_BACKOFF_FACTOR, raise_on_status=False)
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=self._host_pools(len(OLLAMA_ENDPOINTS)), pool_maxsize=pool_size,
+                                    max_retries=retry)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        # Single attempt, used for quick "is the server up?" probes
+        self._probe_session = requests.Session()
+        self._probe_session.mount("http://", HTTPAdapter(pool_maxsize=1, max_retries=0))
+        self._probe_session.mount("https://", HTTPAdapter(pool_maxsize=1, max_retries=0))
+
+    @staticmethod
+    def _host_pools(endpoints):
+        # One per endpoint plus the default server, which probes may still use
+        return max(4, endpoints + 1)
+
+    def set_host_count(self, endpoints):
+        """Make room for a connection pool per endpoint, e.g. after set_endpoints()."""
+        count = self._host_pools(endpoints)
+        if count > self._adapter._pool_connections:
+            self._adapter.poolmanager.clear()
+            self._adapter.init_poolmanager(count, self._pool_size, block=self._adapter._pool_block)
+
+    def _timeout(self, read_timeout=None):
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def get(self, path, read_timeout=None, base_url=None, **kwargs):
+        return self.session.get((base_url or self.base_url) + path, timeout=self._timeout(read_timeout), **kwargs)
+
+    def post(self, path, read_timeout=None, base_url=None, **kwargs):
+        return self.session.post((base_url or self.base_url) + path, timeout=self._timeout(read_timeout), **kwargs)
+
+    def probe(self, path, base_url=None, read_timeout=None):
+        """Single-attempt GET, for health checks that should fail fast."""
+        return self._probe_session.get((base_url or self.base_url) + path, timeout=self._timeout(read_timeout))
+
+    def ping(self, timeout=1, base_url=None):
+        """Return True if the server answers at all, without retrying."""
+        try:
+            self._probe_session.get(base_url or self.base_url, timeout=timeout).close()
+            return True
+        except requests.exceptions.RequestException:
+            return False
+
+    def connection_stats(self):
+        """Requests sent, connections opened and connections reused across all pools."""
+        sent = opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue # Evicted meanwhile
+            sent += pool.num_requests
+            opened += pool.num_connections
+        return {"requests": sent, "connections": opened, "reused": max(0, sent - opened)}
+
+    def close(self):
+        self.session.close()
+        self._probe_session.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide OllamaClient, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
+
+# --- Server Startup ---
+def start_local_server():
+    """Launch `ollama serve` in the background; raises FileNotFoundError if ollama is not installed."""
+    # Adjust the command if 'ollama' is not in PATH or has a specific path
+    if os.name == 'nt': # Windows: CREATE_NO_WINDOW hides the console
+        return subprocess.Popen(["ollama", "serve"], creationflags=subprocess.CREATE_NO_WINDOW)
+    return subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_for_server(timeout=SERVER_START_TIMEOUT, base_url=None, process=None):
+    """Poll the server until it answers, backing off between attempts.
+
+    Returns True once it answers, False after timeout seconds or as soon as
+    process (the Popen of a server we started) has exited.
+    """
+    deadline = time.monotonic() + timeout
+    delay = SERVER_POLL_INITIAL_DELAY
+    while True:
+        if get_client().ping(timeout=1, base_url=base_url):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (process is not None and process.poll() is not None):
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, SERVER_POLL_MAX_DELAY)
+
+# --- Endpoint Pool ---
+def _normalize_endpoint(url):
+    # Accept "host:port", "http://host:port" or the full ".../api" base URL
+    url = url.strip().rstrip("/")
+    if "://" not in url:
+        url = "http://" + url
+    return url if url.endswith("/api") else url + "/api"
+
+def _model_key(model):
+    return model if ":" in model else model + ":latest"
+
+class Endpoint:
+    def __init__(self, url, slots=MAX_PARALLEL_REQUESTS):
+        self.url = url
+        self.slots = slots
+        self.healthy = True # Optimistic until the first probe says otherwise
+        self.models = {} # model name -> its /api/tags entry (size, details)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def describe(self):
+        state = "up" if self.healthy else "down"
+        return f"{self.url} ({state}, {self.outstanding} outstanding, {len(self.models)} models)"
+
+class EndpointPool:
+    """Ollama servers that requests are spread over.
+
+    A background thread probes every endpoint's /api/tags, which both checks
+    health and records which models each one has. Requests go to the
+    healthy endpoint with the model and the fewest outstanding requests.
+    An endpoint whose connection fails is ejected for at least EJECT_SECONDS
+    and readmitted by the first successful probe after that.
+    """
+    def __init__(self, urls=None, interval=HEALTH_CHECK_INTERVAL):
+        urls = urls or [OLLAMA_API_BASE_URL]
+        self.endpoints = [Endpoint(_normalize_endpoint(url)) for url in urls]
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._probe_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def refresh(self):
+        """Probe every endpoint now; returns the union of their models."""
+        threads = [threading.Thread(target=self._probe, args=(endpoint,), daemon=True) for endpoint in self.endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.models()
+
+    def _probe(self, endpoint):
+        try:
+            response = get_client().probe("/tags", base_url=endpoint.url, read_timeout=LIST_READ_TIMEOUT)
+            response.raise_for_status()
+            models = {_model_key(m['name']): m for m in response.json().get('models', [])}
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            with self._lock:
+                if endpoint.healthy:
+                    print(f"Endpoint down: {endpoint.url}")
+                endpoint.healthy = False
+            return
+        with self._lock:
+            endpoint.models = models
+            if not endpoint.healthy and time.time() >= endpoint.ejected_until:
+                print(f"Endpoint readmitted: {endpoint.url}")
+                endpoint.healthy = True
+                endpoint.failures = 0
+
+    def includes(self, url):
+        """Whether url (in any form _normalize_endpoint accepts) is one of the endpoints."""
+        return _normalize_endpoint(url) in [e.url for e in self.endpoints]
+
+    def models(self):
+        with self._lock:
+            return sorted(set().union(*(e.models for e in self.endpoints if e.healthy)))
+
+    def model_details(self, model):
+        """The /api/tags entry of model from the first healthy endpoint that has it, or {}."""
+        key = _model_key(model)
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.healthy and key in endpoint.models:
+                    return endpoint.models[key]
+        return {}
+
+    def endpoints_for(self, model):
+        """Healthy endpoints that have model (all healthy ones if none report it)."""
+        key = _model_key(model)
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            return [e for e in healthy if key in e.models] or healthy
+
+    def capacity(self):
+        with self._lock:
+            return max(1, sum(e.slots for e in self.endpoints if e.healthy))
+
+    def acquire(self, model, exclude=()):
+        key = _model_key(model)
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+            healthy = [e for e in candidates if e.healthy] or candidates
+            with_model = [e for e in healthy if key in e.models] or healthy
+            # Least outstanding requests relative to capacity, first listed on ties
+            endpoint = min(with_model, key=lambda e: e.outstanding / e.slots)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint):
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def eject(self, endpoint, error=None):
+        with self._lock:
+            endpoint.failures += 1
+            endpoint.ejected_until = time.time() + EJECT_SECONDS
+            if endpoint.healthy and len(self.endpoints) > 1:
+                print(f"Endpoint ejected: {endpoint.url} ({error})")
+                endpoint.healthy = False
+
+    def describe(self):
+        with self._lock:
+            return [e.describe() for e in self.endpoints]
+
+_endpoint_pool = None
+_endpoint_pool_lock = threading.Lock()
+
+def get_endpoint_pool():
+    """Return the process-wide EndpointPool (from OLLAMA_ENDPOINTS), starting its probes on first use."""
+    global _endpoint_pool
+    with _endpoint_pool_lock:
+        if _endpoint_pool is None:
+            _endpoint_pool = EndpointPool(OLLAMA_ENDPOINTS)
+            _endpoint_pool.start()
+        return _endpoint_pool
+
+def set_endpoints(urls):
+    """Replace the process-wide pool, e.g. from command-line options."""
+    global _endpoint_pool
+    with _endpoint_pool_lock:
+        if _endpoint_pool is not None:
+            _endpoint_pool.stop()
+        _endpoint_pool = EndpointPool(urls)
+        get_client().set_host_count(len(_endpoint_pool.endpoints))
+        _endpoint_pool.start()
+        return _endpoint_pool
+
+# --- Model Residency ---
+def _keep_alive_value(keep_alive):
+    # Ollama accepts durations as strings ("30m") or seconds as numbers
+    try:
+        return int(keep_alive)
+    except (TypeError, ValueError):
+        return keep_alive
+
+def _generate_on_all(model, payload, read_timeout=None):
+    # Requests for a model may go to any endpoint that has it, so residency
+    # changes are sent to all of them; the first answer is returned.
+    results = []
+    errors = []
+    for endpoint in get_endpoint_pool().endpoints_for(model):
+        try:
+            response = get_client().post("/generate", base_url=endpoint.url, json=payload, read_timeout=read_timeout)
+            response.raise_for_status()
+            results.append(response.json())
+        except requests.exceptions.RequestException as e:
+            errors.append(e)
+    if not results and errors:
+        raise errors[0]
+    return results[0] if results else {}
+
+def load_model(model, keep_alive=MODEL_KEEP_ALIVE):
+    """Load model into memory ahead of the first request and keep it for keep_alive."""
+    # A generate request without a prompt only loads the model. Its window
+    # must be the one translations ask for, or the first one reloads it.
+    payload = {"model": model, "stream": False, "keep_alive": _keep_alive_value(keep_alive)}
+    options = get_model_info(model).load_options()
+    if options:
+        payload["options"] = options
+    return _generate_on_all(model, payload, read_timeout=MODEL_LOAD_TIMEOUT)
+
+def unload_model(model):
+    """Ask the server to free the memory held by model."""
+    return _generate_on_all(model, {"model": model, "stream": False, "keep_alive": 0})
+
+# --- Model Manager ---
+def parse_timestamp(text):
+    """Seconds since the epoch of an RFC 3339 time from Ollama (with up to nanoseconds), or None."""
+    match = re.match(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:?\d\d)?$', text or "")
+    if not match:
+        return None
+    moment = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S")
+    offset = match.group(3)
+    if offset and offset != "Z":
+        sign = -1 if offset[0] == "-" else 1
+        offset = offset[1:].replace(":", "")
+        moment -= sign * timedelta(hours=int(offset[:2]), minutes=int(offset[2:]))
+    fraction = float(match.group(2)) if match.group(2) else 0.0
+    return (moment - datetime(1970, 1, 1)).total_seconds() + fraction
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def describe_model_details(entry):
+    """Parameter count, quantization and size from an /api/tags or /api/ps entry, e.g. "8.0B Q4_0, 4.7 GB"."""
+    details = entry.get("details") or {}
+    parts = [details.get(key) for key in ("parameter_size", "quantization_level") if details.get(key)]
+    text = " ".join(parts)
+    if entry.get("size"):
+        text += (", " if text else "") + format_bytes(entry["size"])
+    return text
+
+class ResidentModel:
+    """A model loaded on one server, from its /api/ps entry."""
+    def __init__(self, endpoint_url, entry):
+        self.endpoint_url = endpoint_url
+        self.name = _model_key(entry.get("name") or entry.get("model") or "")
+        self.size = int(entry.get("size") or 0)
+        self.size_vram = int(entry.get("size_vram") or 0)
+        self.expires_at = parse_timestamp(entry.get("expires_at"))
+        self.entry = entry
+
+    def describe(self, now=None):
+        text = f"{self.name} - {format_bytes(self.size)}"
+        if self.size:
+            text += f" ({100 * self.size_vram / self.size:.0f}% GPU)"
+        if self.expires_at is not None:
+            remaining = self.expires_at - (now or time.time())
+            if remaining > KEEP_LOADED_SECONDS:
+                text += ", kept loaded"
+            elif remaining > 0:
+                text += f", unloads in {remaining / 60:.0f} min" if remaining >= 60 else f", unloads in {remaining:.0f}s"
+            else:
+                text += ", unloading"
+        return text
+
+class ModelManager:
+    """Which models the servers have loaded, from /api/ps, with LRU eviction under a memory budget.
+
+    poll() reads /api/ps from every healthy endpoint (start() does so in
+    the background and calls on_change(manager) after each round).
+    make_room(model) unloads the least recently used loaded models on the
+    servers that would run model until its size fits budget_bytes there.
+    A model's size is the memory it took when last seen loaded, or its
+    /api/tags size before that. Models are used when touch()ed; models
+    loaded by other clients count as least recently used.
+    """
+    def __init__(self, budget_bytes=MODEL_MEMORY_BUDGET_GB * 1024 ** 3, interval=PS_POLL_INTERVAL, on_change=None):
+        self.budget_bytes = budget_bytes
+        self.interval = interval
+        self.on_change = on_change
+        self.resident = {} # endpoint url -> [ResidentModel]
+        self.last_used = {} # model name -> time of last use
+        self._sizes = {} # model name -> memory it took when last loaded
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            self.poll()
+            if self.on_change:
+                self.on_change(self)
+            self._stop.wait(self.interval)
+
+    def poll(self):
+        """Read /api/ps from every healthy endpoint; returns models()."""
+        resident = {}
+        for endpoint in get_endpoint_pool().endpoints:
+            if not endpoint.healthy:
+                continue
+            try:
+                response = get_client().probe("/ps", base_url=endpoint.url, read_timeout=LIST_READ_TIMEOUT)
+                response.raise_for_status()
+                resident[endpoint.url] = [ResidentModel(endpoint.url, entry) for entry in response.json().get('models', [])]
+            except (requests.exceptions.RequestException, ValueError, KeyError, AttributeError):
+                continue # Shown as having nothing loaded; the pool's probes track its health
+        with self._lock:
+            self.resident = resident
+            for models in resident.values():
+                for model in models:
+                    if model.size:
+                        self._sizes[model.name] = model.size
+        return self.models()
+
+    def models(self):
+        with self._lock:
+            return sorted((m for models in self.resident.values() for m in models), key=lambda m: (m.name, m.endpoint_url))
+
+    def memory_used(self):
+        with self._lock:
+            return sum(m.size for models in self.resident.values() for m in models)
+
+    def touch(self, model):
+        with self._lock:
+            self.last_used[_model_key(model)] = time.time()
+
+    def required_bytes(self, model):
+        key = _model_key(model)
+        with self._lock:
+            size = self._sizes.get(key)
+        return size or int(get_endpoint_pool().model_details(model).get("size") or 0)
+
+    def make_room(self, model, keep=()):
+        """Unload least recently used models until model fits the budget; returns the names unloaded.
+
+        model and the models in keep (e.g. a draft model) are never unloaded.
+        """
+        if self.budget_bytes <= 0:
+            return []
+        self.poll()
+        self.touch(model)
+        protected = {_model_key(m) for m in keep if m} | {_model_key(model)}
+        needed = self.required_bytes(model)
+        evicted = []
+        for endpoint in get_endpoint_pool().endpoints_for(model):
+            with self._lock:
+                resident = list(self.resident.get(endpoint.url, []))
+                last_used = dict(self.last_used)
+            if any(m.name == _model_key(model) for m in resident):
+                continue # Already loaded there
+            used = sum(m.size for m in resident)
+            candidates = sorted((m for m in resident if m.name not in protected),
+                                key=lambda m: (last_used.get(m.name, 0), m.expires_at or 0))
+            while used + needed > self.budget_bytes and candidates:
+                victim = candidates.pop(0)
+                try:
+                    unload_resident(victim)
+                except requests.exceptions.RequestException as e:
+                    print(f"Could not unload {victim.name} from {endpoint.url}: {e}")
+                    continue
+                print(f"Unloaded {victim.name} ({format_bytes(victim.size)}) from {endpoint.url} to make room for {model}")
+                used -= victim.size
+                evicted.append(victim.name)
+            if used + needed > self.budget_bytes:
+                print(f"Warning: {model} ({format_bytes(needed)}) does not fit the {format_bytes(self.budget_bytes)} "
+                      f"memory budget on {endpoint.url}")
+        if evicted:
+            self.poll()
+        return evicted
+
+def unload_resident(resident):
+    """Unload a ResidentModel from the server it is loaded on."""
+    response = get_client().post("/generate", base_url=resident.endpoint_url,
+                                 json={"model": resident.name, "stream": False, "keep_alive": 0})
+    response.raise_for_status()
+
+_model_manager = None
+_model_manager_lock = threading.Lock()
+
+def get_model_manager():
+    """Return the process-wide ModelManager; call its start() to poll in the background."""
+    global _model_manager
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelManager()
+        return _model_manager
+
+# --- Model Information ---
+class ModelInfo:
+    """Context window and parameters of a model, from /api/show.
+
+    context_length is what the model supports, num_ctx the window the server
+    allocates by default (the Modelfile's num_ctx parameter). Requests are
+    planned against num_ctx and only ask for a larger window, in doubling
+    steps up to context_length, when a prompt does not fit; every different
+    num_ctx makes the server reload the model. Without a num_ctx parameter
+    the server's default window is left alone, both when the model is loaded
+    and by requests that fit into DEFAULT_NUM_CTX.
+    """
+    def __init__(self, name, show=None):
+        show = show or {}
+        self.name = name
+        self.parameters = {}
+        for line in show.get("parameters", "").splitlines():
+            key, _, value = line.strip().partition(" ")
+            if key:
+                self.parameters.setdefault(key, []).append(value.strip())
+        model_info = show.get("model_info") or {}
+        lengths = [value for key, value in model_info.items() if key.endswith(".context_length")]
+        try:
+            self.num_ctx = int(self.parameters["num_ctx"][-1])
+            self.has_num_ctx = True
+        except (KeyError, ValueError):
+            self.num_ctx = DEFAULT_NUM_CTX
+            self.has_num_ctx = False
+        self.context_length = int(lengths[0]) if lengths else max(self.num_ctx, DEFAULT_NUM_CTX)
+        self.num_ctx = min(self.num_ctx, self.context_length)
+
+    def max_segment_chars(self, overhead_tokens):
+        """Longest segment whose prompt and expected output fit the default window."""
+        available = self.num_ctx - overhead_tokens - PROMPT_TEMPLATE_TOKENS - NUM_PREDICT_MARGIN
+        return max(1, int(available / (1 + OUTPUT_TOKEN_RATIO))) * CHARS_PER_TOKEN
+
+    def request_options(self, prompt_tokens, source_tokens):
+        """num_ctx and num_predict for one request."""
+        num_predict = int(source_tokens * OUTPUT_TOKEN_RATIO) + NUM_PREDICT_MARGIN
+        needed = prompt_tokens + PROMPT_TEMPLATE_TOKENS + num_predict
+        num_ctx = self.num_ctx
+        while num_ctx < needed and num_ctx < self.context_length:
+            num_ctx = min(num_ctx * 2, self.context_length)
+        # At the model's limit, leave the output what the prompt leaves over
+        num_predict = max(1, min(num_predict, num_ctx - prompt_tokens - PROMPT_TEMPLATE_TOKENS))
+        if num_ctx == self.num_ctx and not self.has_num_ctx:
+            return {"num_predict": num_predict} # Fits the window the model was loaded with
+        return {"num_ctx": num_ctx, "num_predict": num_predict}
+
+    def load_options(self):
+        """Options for loading the model with the window that requests will use."""
+        return {"num_ctx": self.num_ctx} if self.has_num_ctx else {}
+
+    def describe(self):
+        return f"ctx {self.num_ctx}/{self.context_length}"
+
+_model_infos = {}
+_model_info_lock = threading.Lock()
+
+def get_model_info(model, refresh=False, fetch=True):
+    """Return the ModelInfo of model, asking /api/show on first use.
+
+    The answer is cached per model; if the server cannot tell, defaults are
+    cached instead, so a failing lookup is not repeated for every request.
+    With fetch=False nothing is requested (for the UI thread) and defaults
+    stand in for a model that was not looked up yet.
+    """
+    # The lock only guards the cache; the UI thread must never wait for /api/show
+    with _model_info_lock:
+        if model in _model_infos and not refresh:
+            return _model_infos[model]
+    if not fetch:
+        return ModelInfo(model)
+    endpoint = get_endpoint_pool().endpoints_for(model)
+    try:
+        response = get_client().post("/show", base_url=endpoint[0].url if endpoint else None,
+                                     json={"model": model}, read_timeout=LIST_READ_TIMEOUT)
+        response.raise_for_status()
+        info = ModelInfo(model, response.json())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Could not read model information for {model}: {e}")
+        info = ModelInfo(model)
+    with _model_info_lock:
+        if refresh or model not in _model_infos: # Otherwise a concurrent lookup got there first
+            _model_infos[model] = info
+        return _model_infos[model]
+
+def segment_chars_for(model, direction, fetch=True):
+    """Segment size for model: MAX_SEGMENT_CHARS, or less if its context window needs it."""
+    overhead = estimate_tokens(build_prompt_prefix(direction)) + max(0, CONTEXT_TOKEN_BUDGET)
+    return min(MAX_SEGMENT_CHARS, get_model_info(model, fetch=fetch).max_segment_chars(overhead))
+
+# --- Prompting ---
+def _languages(direction):
+    return ("German", "English") if direction == "de-en" else ("English", "German")
+
+def _placeholder_instruction():
+    return " Copy placeholders such as {{1}} unchanged into the translation." if MASK_SPANS else ""
+
+def build_translation_prompt(direction):
+    source_lang, target_lang = _languages(direction)
+    # Basic prompt - can be refined
+    return (f"Translate the following text from {source_lang} to {target_lang}.{_placeholder_instruction()} "
+            f"Output only the translation, without any introductory phrases or explanations:\n\n")
+
+def build_system_prompt(direction):
+    # Must not vary between segments, or the server cannot reuse its cached prefix
+    source_lang, target_lang = _languages(direction)
+    return (f"You translate text from {source_lang} to {target_lang}. Reply to every message with its translation "
+            f"only, without any introductory phrases or explanations.{_placeholder_instruction()}")
+
+def build_prompt_prefix(direction, backend=PROMPT_BACKEND):
+    """The instruction part of the prompt for backend; also part of the translation memory key."""
+    return build_system_prompt(direction) if backend == "chat" else build_translation_prompt(direction)
+
+def build_batch_prompt_prefix(direction, backend=PROMPT_BACKEND):
+    """Like build_prompt_prefix(), for several texts numbered [1], [2], ... in one request."""
+    source_lang, target_lang = _languages(direction)
+    if backend == "chat":
+        return (f"You translate text from {source_lang} to {target_lang}. Every message holds several texts, each "
+                f"starting with a marker like [1]. Reply with the translation of each text after its unchanged "
+                f"marker, in the same order, without any introductory phrases or explanations."
+                f"{_placeholder_instruction()}")
+    return (f"Translate each of the following texts from {source_lang} to {target_lang}. Keep the marker like [1] "
+            f"in front of each translation and output only the marked translations, without any introductory "
+            f"phrases or explanations.{_placeholder_instruction()}\n\n")
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def rolling_context(segments, translations, index, budget=CONTEXT_TOKEN_BUDGET):
+    """(source, translation) of the nearest earlier non-blank segment, or None.
+
+    Only returned once that segment is translated and both fit in budget tokens.
+    """
+    if budget <= 0:
+        return None
+    for previous in range(index - 1, -1, -1):
+        source = segments[previous][0]
+        if source.strip():
+            translation = translations[previous]
+            if translation is None or estimate_tokens(source) + estimate_tokens(translation) > budget:
+                return None
+            return source, translation
+    return None
+
+# --- Segmentation ---
+def _split_long_paragraph(paragraph, max_chars):
+    # Break on sentence ends first, then on the last space that fits, then hard.
+    units = []
+    parts = SENTENCE_BREAK_RE.split(paragraph)
+    for i in range(0, len(parts), 2):
+        sentence = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                units.append((sentence[:max_chars], ""))
+                sentence = sentence[max_chars:]
+            else:
+                units.append((sentence[:cut], " "))
+                sentence = sentence[cut + 1:]
+        units.append((sentence, separator))
+    return units
+
+def split_into_segments(text, max_chars=MAX_SEGMENT_CHARS):
+    """Split text into (segment, separator) pairs, one per paragraph.
+
+    Paragraphs longer than max_chars are cut on sentence boundaries. A fenced
+    code block stays in one segment, blank lines and all. Otherwise segment
+    boundaries only depend on the paragraph itself, so an edit elsewhere in the
+    document leaves the other segments (and their cache keys) unchanged.
+    Joining every segment followed by its separator gives back the original text.
+    """
+    paragraphs = []
+    parts = PARAGRAPH_BREAK_RE.split(text)
+    for i in range(0, len(parts), 2):
+        paragraph = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        if paragraphs and paragraphs[-1][0].count("```") % 2:
+            # Still inside a code block
+            previous, previous_separator = paragraphs[-1]
+            paragraphs[-1] = (previous + previous_separator + paragraph, separator)
+        else:
+            paragraphs.append((paragraph, separator))
+    segments = []
+    for paragraph, separator in paragraphs:
+        if len(paragraph) <= max_chars or paragraph.lstrip().startswith("```"):
+            segments.append((paragraph, separator))
+        else:
+            units = _split_long_paragraph(paragraph, max_chars)
+            units[-1] = (units[-1][0], units[-1][1] + separator)
+            segments.extend(units)
+    return segments
+
+# --- Masking ---
+def mask_segment(segment):
+    """Replace the spans of segment that need no translation with {{1}}, {{2}}, ...
+
+    Returns (masked text, spans), spans[i] being what {{i + 1}} stands for.
+    Spans no longer than their placeholder are left alone (nothing to save)
+    unless they are code blocks or already look like a placeholder.
+    """
+    spans = []
+
+    def replace(match):
+        span = match.group(0)
+        placeholder = "{{%d}}" % (len(spans) + 1)
+        if len(span) <= len(placeholder) and not match.group('always'):
+            return span
+        spans.append(span)
+        return placeholder
+
+    return MASK_RE.sub(replace, segment), spans
+
+def unmask(text, spans):
+    # Placeholders the model made up are left as they are
+    return PLACEHOLDER_RE.sub(lambda m: spans[int(m.group(1)) - 1] if 0 < int(m.group(1)) <= len(spans) else m.group(0), text)
+
+def is_untranslatable(masked):
+    """True if a masked segment has no words left, only placeholders, numbers and punctuation."""
+    return not LETTER_RE.search(PLACEHOLDER_RE.sub("", masked))
+
+class PlaceholderRestorer:
+    """Puts the masked spans back into streamed text.
+
+    A placeholder may be split across streamed pieces, so the end of a piece
+    that could be the start of one is held back until the next piece.
+    """
+    def __init__(self, spans):
+        self.spans = spans
+        self.restored = set()
+        self._pending = ""
+
+    def _restore(self, text):
+        def replace(match):
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(self.spans):
+                self.restored.add(index)
+                return self.spans[index]
+            return match.group(0)
+        return PLACEHOLDER_RE.sub(replace, text)
+
+    def feed(self, part):
+        text = self._pending + part
+        match = PARTIAL_PLACEHOLDER_RE.search(text)
+        cut = match.start() if match else len(text)
+        self._pending = text[cut:]
+        return self._restore(text[:cut])
+
+    def flush(self):
+        text, self._pending = self._pending, ""
+        return self._restore(text)
+
+    def missing(self):
+        return len(self.spans) - len(self.restored)
+
+class OrderedChunkWriter:
+    """Forwards text from concurrently translated segments to a sink in segment order.
+
+    Text for the first unfinished segment is passed straight through; text for
+    later segments is buffered until every segment before it has finished.
+    """
+    def __init__(self, count, sink):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._buffers = [[] for _ in range(count)]
+        self._finished = [False] * count
+        self._next = 0
+
+    def write(self, index, text):
+        with self._lock:
+            if index == self._next:
+                self.sink(text)
+            else:
+                self._buffers[index].append(text)
+
+    def finish(self, index, trailer=""):
+        with self._lock:
+            if trailer:
+                if index == self._next:
+                    self.sink(trailer)
+                else:
+                    self._buffers[index].append(trailer)
+            self._finished[index] = True
+            while self._next < len(self._finished) and self._finished[self._next]:
+                self._next += 1
+                if self._next < len(self._buffers) and self._buffers[self._next]:
+                    self.sink("".join(self._buffers[self._next]))
+                    self._buffers[self._next] = []
+
+# --- Translation Memory ---
+class TranslationCache:
+    """SQLite-backed segment cache keyed by model, direction, prompt and normalized text.
+
+    Entries older than max_age_days are dropped and, beyond max_entries, the
+    least recently used ones are evicted. Safe to use from worker threads.
+    """
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " direction TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS segments_last_used ON segments (last_used)")
+        self.evict()
+
+    @staticmethod
+    def make_key(model, direction, prompt, segment):
+        normalized = " ".join(segment.split())
+        segment_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f"{model}|{direction}|{prompt_hash}|{segment_hash}"
+
+    def get(self, model, direction, prompt, segment):
+        key = self.make_key(model, direction, prompt, segment)
+        with self._lock:
+            row = self._conn.execute("SELECT translation FROM segments WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE segments SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, model, direction, prompt, segment, translation):
+        key = self.make_key(model, direction, prompt, segment)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO segments (key, model, direction, translation, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, model, direction, translation, now, now))
+
+    def evict(self):
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE last_used < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM segments WHERE key IN ("
+                " SELECT key FROM segments ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+# --- Metrics ---
+class TranslationMetrics:
+    """Timing and token counts for one translation run.
+
+    Combines client-side timestamps (time to first token, wall time) with the
+    statistics Ollama reports in the final chunk of every generation.
+    Durations reported by Ollama are in nanoseconds.
+    """
+    def __init__(self, model, direction):
+        self.model = model
+        self.direction = direction
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._first_token = None
+        self._finished = None
+        self._lock = threading.Lock()
+        self.status = "running"
+        self.segments = 0
+        self.cached_segments = 0
+        self.reused_segments = 0 # Unchanged since the previous run of an edited text
+        self.skipped_segments = 0 # Nothing to translate once masked, not sent
+        self.masked_spans = 0
+        self.mask_tokens_saved = 0 # Estimated source tokens not sent because of masking and skipping
+        self.streamed_chunks = 0
+        self.requests = 0
+        self.request_seconds = 0.0 # Client-side wall time of all generate calls
+        self.load_duration = 0
+        self.prompt_eval_count = 0
+        self.prompt_eval_duration = 0
+        self.prompt_tokens = 0 # Estimated tokens sent, see estimate_tokens()
+        self.prompt_tokens_saved = 0 # Estimated tokens the server took from its prefix cache
+        self.eval_count = 0
+        self.eval_duration = 0
+        self.total_duration = 0
+
+    def on_text(self, streamed=True):
+        with self._lock:
+            if self._first_token is None:
+                self._first_token = time.perf_counter()
+            if streamed:
+                self.streamed_chunks += 1
+
+    def add_cached_segment(self):
+        with self._lock:
+            self.segments += 1
+            self.cached_segments += 1
+
+    def add_reused_segments(self, count):
+        with self._lock:
+            self.segments += count
+            self.reused_segments += count
+
+    def add_skipped_segment(self, tokens):
+        with self._lock:
+            self.segments += 1
+            self.skipped_segments += 1
+            self.mask_tokens_saved += tokens
+
+    def add_masking(self, spans, tokens_saved):
+        with self._lock:
+            self.masked_spans += spans
+            self.mask_tokens_saved += max(0, tokens_saved)
+
+    def add_generation(self, final_chunk, elapsed, prompt_tokens=None):
+        with self._lock:
+            if prompt_tokens is not None:
+                # Ollama only counts the prompt tokens it had to evaluate
+                self.prompt_tokens += prompt_tokens
+                self.prompt_tokens_saved += max(0, prompt_tokens - final_chunk.get('prompt_eval_count', 0))
+            self.segments += 1
+            self.requests += 1
+            self.request_seconds += elapsed
+            self.load_duration += final_chunk.get('load_duration', 0)
+            self.prompt_eval_count += final_chunk.get('prompt_eval_count', 0)
+            self.prompt_eval_duration += final_chunk.get('prompt_eval_duration', 0)
+            self.eval_count += final_chunk.get('eval_count', 0)
+            self.eval_duration += final_chunk.get('eval_duration', 0)
+            self.total_duration += final_chunk.get('total_duration', 0)
+
+    def finish(self, status):
+        with self._lock:
+            self.status = status
+            self._finished = time.perf_counter()
+
+    def summary(self):
+        with self._lock:
+            now = self._finished or time.perf_counter()
+            wall = now - self._started
+            ttft = self._first_token - self._started if self._first_token is not None else None
+            if self.eval_duration:
+                tokens_per_s = self.eval_count / (self.eval_duration / 1e9)
+            elif self._first_token is not None and now > self._first_token:
+                # Live estimate while running: Ollama streams roughly one token per chunk
+                tokens_per_s = self.streamed_chunks / (now - self._first_token)
+            else:
+                tokens_per_s = None
+            overhead = self.request_seconds - self.total_duration / 1e9
+            return {
+                "timestamp": self.started_at,
+                "model": self.model,
+                "direction": self.direction,
+                "status": self.status,
+                "segments": self.segments,
+                "cached_segments": self.cached_segments,
+                "reused_segments": self.reused_segments,
+                "skipped_segments": self.skipped_segments,
+                "masked_spans": self.masked_spans,
+                "mask_tokens_saved": self.mask_tokens_saved,
+                "wall_time_s": round(wall, 4),
+                "ttft_s": round(ttft, 4) if ttft is not None else None,
+                "tokens_per_s": round(tokens_per_s, 2) if tokens_per_s is not None else None,
+                "throughput_tokens_per_s": round(self.eval_count / wall, 2) if wall > 0 else None,
+                "load_time_s": round(self.load_duration / 1e9, 4),
+                "prompt_eval_count": self.prompt_eval_count,
+                "prompt_eval_s": round(self.prompt_eval_duration / 1e9, 4),
+                "prompt_eval_s_per_request": round(self.prompt_eval_duration / 1e9 / self.requests, 4) if self.requests else None,
+                "prompt_tokens_estimated": self.prompt_tokens,
+                "prompt_tokens_saved": self.prompt_tokens_saved,
+                "eval_count": self.eval_count,
+                "client_overhead_s": round(overhead / self.requests, 4) if self.requests else None,
+            }
+
+def format_metrics(summary):
+    """One-line readout such as 'TTFT 0.42s | 38.1 tok/s | load 1.20s | overhead 12ms'."""
+    parts = []
+    if summary.get("ttft_s") is not None:
+        parts.append(f"TTFT {summary['ttft_s']:.2f}s")
+    if summary.get("tokens_per_s") is not None:
+        parts.append(f"{summary['tokens_per_s']:.1f} tok/s")
+    if summary.get("load_time_s"):
+        parts.append(f"load {summary['load_time_s']:.2f}s")
+    if summary.get("prompt_eval_s_per_request") is not None:
+        parts.append(f"prompt {summary['prompt_eval_s_per_request'] * 1000:.0f}ms/seg")
+    if summary.get("prompt_tokens_saved"):
+        parts.append(f"{summary['prompt_tokens_saved']} prompt tok cached")
+    if summary.get("client_overhead_s") is not None:
+        parts.append(f"overhead {summary['client_overhead_s'] * 1000:.0f}ms")
+    if summary.get("reused_segments"):
+        parts.append(f"{summary['reused_segments']}/{summary['segments']} unchanged")
+    if summary.get("cached_segments"):
+        parts.append(f"{summary['cached_segments']}/{summary['segments']} cached")
+    if summary.get("skipped_segments"):
+        parts.append(f"{summary['skipped_segments']}/{summary['segments']} skipped")
+    if summary.get("mask_tokens_saved"):
+        parts.append(f"{summary['mask_tokens_saved']} tok masked")
+    return " | ".join(parts)
+
+def _format_sample(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class MetricsRecorder:
+    """Appends run summaries to a JSONL log and keeps a Prometheus text-format file current.
+
+    The .prom file is rewritten atomically after every run (node_exporter
+    textfile collector style) with cumulative counters and last-run gauges.
+    """
+    COUNTERS = (
+        ("runs_total", "Translation runs", None),
+        ("segments_total", "Segments translated", "segments"),
+        ("cached_segments_total", "Segments served from the translation memory", "cached_segments"),
+        ("reused_segments_total", "Segments kept unchanged from the previous run of an edited text", "reused_segments"),
+        ("skipped_segments_total", "Segments with nothing to translate that were not sent", "skipped_segments"),
+        ("mask_tokens_saved_total", "Estimated source tokens not sent because of masking and skipping", "mask_tokens_saved"),
+        ("prompt_eval_tokens_total", "Prompt tokens evaluated", "prompt_eval_count"),
+        ("prompt_tokens_saved_total", "Estimated prompt tokens served from the server's prefix cache", "prompt_tokens_saved"),
+        ("eval_tokens_total", "Tokens generated", "eval_count"),
+    )
+    GAUGES = (
+        ("last_ttft_seconds", "Time to first token of the last run", "ttft_s"),
+        ("last_tokens_per_second", "Generation rate of the last run", "tokens_per_s"),
+        ("last_throughput_tokens_per_second", "Generated tokens per wall-clock second of the last run", "throughput_tokens_per_s"),
+        ("last_load_seconds", "Model load time of the last run", "load_time_s"),
+        ("last_prompt_eval_seconds", "Prompt evaluation time of the last run", "prompt_eval_s"),
+        ("last_prompt_eval_seconds_per_request", "Prompt evaluation time per request of the last run", "prompt_eval_s_per_request"),
+        ("last_client_overhead_seconds", "Client-side overhead per request of the last run", "client_overhead_s"),
+        ("last_wall_seconds", "Wall-clock time of the last run", "wall_time_s"),
+        ("last_run_timestamp_seconds", "Start time of the last run", "timestamp"),
+    )
+    STARTUP_GAUGES = (
+        ("startup_window_seconds", "Time from launch until the window was drawn", "window_s"),
+        ("startup_server_ready_seconds", "Time from launch until the Ollama server answered", "server_ready_s"),
+    )
+    PREFIX = "ollama_translator_"
+
+    def __init__(self, directory=METRICS_DIR):
+        self.jsonl_path = os.path.join(directory, "metrics.jsonl")
+        self.startup_path = os.path.join(directory, "startup.jsonl")
+        self.prom_path = os.path.join(directory, "metrics.prom")
+        self._lock = threading.Lock()
+        self._samples = None # {(name, labels): value}, loaded from the .prom file on first use
+
+    def record(self, summary):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(summary) + "\n")
+            self._update_samples(summary)
+            self._write_prom()
+
+    def record_startup(self, summary):
+        """Log one application start (window_s, server_ready_s, ...) to startup.jsonl and the .prom file."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.startup_path), exist_ok=True)
+            with open(self.startup_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(summary) + "\n")
+            if self._samples is None:
+                self._samples = self._load_samples()
+            for name, _, field in self.STARTUP_GAUGES:
+                if summary.get(field) is not None:
+                    self._samples[(self.PREFIX + name, "")] = summary[field]
+            self._write_prom()
+
+    def _load_samples(self):
+        samples = {}
+        try:
+            with open(self.prom_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith("#") or not line.strip():
+                        continue
+                    series, _, value = line.rstrip("\n").rpartition(" ")
+                    name, _, labels = series.partition("{")
+                    samples[(name, "{" + labels if labels else "")] = float(value)
+        except (OSError, ValueError):
+            pass
+        return samples
+
+    def _update_samples(self, summary):
+        if self._samples is None:
+            self._samples = self._load_samples()
+        model = summary["model"].replace("\\", "\\\\").replace('"', '\\"')
+        labels = f'{{model="{model}",direction="{summary["direction"]}"}}'
+        run_labels = labels[:-1] + f',status="{summary["status"]}"}}'
+        for name, _, field in self.COUNTERS:
+            key = (self.PREFIX + name, run_labels if field is None else labels)
+            self._samples[key] = self._samples.get(key, 0) + (1 if field is None else summary.get(field) or 0)
+        for name, _, field in self.GAUGES:
+            if summary.get(field) is not None:
+                self._samples[(self.PREFIX + name, labels)] = summary[field]
+
+    def _write_prom(self):
+        lines = []
+        for kind, metrics in (("counter", self.COUNTERS), ("gauge", self.GAUGES + self.STARTUP_GAUGES)):
+            for name, help_text, _ in metrics:
+                full_name = self.PREFIX + name
+                series = sorted((labels, value) for (n, labels), value in self._samples.items() if n == full_name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                lines.extend(f"{full_name}{labels} {_format_sample(value)}" for labels, value in series)
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+# --- Cancellation ---
+class AbortController(dict):
+    """The {'abort': bool} flag shared with worker threads, plus their open HTTP responses.
+
+    abort() sets the flag and shuts down every tracked response, so a worker
+    blocked on the stream wakes up at once and Ollama, seeing the client
+    disconnect, stops generating instead of running to the end.
+    """
+    def __init__(self):
+        super().__init__(abort=False)
+        self._lock = threading.Lock()
+        self._responses = set()
+
+    def track(self, response):
+        with self._lock:
+            if not self['abort']:
+                self._responses.add(response)
+                return
+        _shutdown_response(response) # Aborted before the response was registered
+
+    def untrack(self, response):
+        with self._lock:
+            self._responses.discard(response)
+
+    def abort(self):
+        with self._lock:
+            self['abort'] = True
+            responses = list(self._responses)
+            self._responses.clear()
+        for response in responses:
+            _shutdown_response(response)
+
+def _shutdown_response(response):
+    # close() alone does not wake a thread blocked reading the socket, shutdown() does
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # Already closed
+    response.close()
+
+# --- Translation Engine ---
+def translate_segment(model, direction, prompt_prefix, segment, on_text, controller, cache=None, metrics=None,
+                      keep_alive=MODEL_KEEP_ALIVE, context=None, backend=PROMPT_BACKEND):
+    """Translate one segment, streaming pieces to on_text.
+
+    prompt_prefix comes from build_prompt_prefix(direction, backend). With the
+    chat backend it is the system message and context, a (source, translation)
+    pair from rolling_context(), is sent as the preceding exchange.
+    With MASK_SPANS, code, URLs and markup are sent as placeholders and
+    restored before the text reaches on_text; a segment with nothing left
+    to translate is returned unchanged without a request.
+    controller is an AbortController. Returns the complete translation, or
+    None if the controller was aborted.
+    """
+    if controller['abort']:
+        return None
+    masked, spans = mask_segment(segment) if MASK_SPANS else (segment, [])
+    if MASK_SPANS and is_untranslatable(masked):
+        if metrics:
+            metrics.on_text(streamed=False)
+            metrics.add_skipped_segment(estimate_tokens(segment))
+        on_text(segment)
+        return segment
+    if cache:
+        cached = cache.get(model, direction, prompt_prefix, segment)
+        if cached is not None:
+            if metrics:
+                metrics.on_text(streamed=False)
+                metrics.add_cached_segment()
+            on_text(cached)
+            return cached
+
+    sink = on_text
+    if spans:
+        restorer = PlaceholderRestorer(spans)
+
+        def restore(part):
+            text = restorer.feed(part)
+            if text:
+                on_text(text)
+
+        sink = restore
+        if metrics:
+            metrics.add_masking(len(spans), estimate_tokens(segment) - estimate_tokens(masked))
+
+    if backend == "chat":
+        messages = [{"role": "system", "content": prompt_prefix}]
+        if context:
+            messages += [{"role": "user", "content": context[0]}, {"role": "assistant", "content": context[1]}]
+        messages.append({"role": "user", "content": masked})
+        path = "/chat"
+        payload = {"model": model, "messages": messages}
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+    else:
+        path = "/generate"
+        payload = {"model": model, "prompt": prompt_prefix + masked}
+        prompt_tokens = estimate_tokens(payload["prompt"])
+    payload["stream"] = True # Use streaming API
+    payload["keep_alive"] = _keep_alive_value(keep_alive)
+    # Fits the window to prompt plus expected output, and stops runaway generations
+    payload["options"] = get_model_info(model).request_options(prompt_tokens, estimate_tokens(masked))
+    parts = []
+    pool = get_endpoint_pool()
+    tried = []
+    while True:
+        endpoint = pool.acquire(model, exclude=tried)
+        try:
+            done = _stream_generate(endpoint.url, path, payload, parts, sink, controller, metrics, prompt_tokens)
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if controller['abort']:
+                return None
+            pool.eject(endpoint, e)
+            tried.append(endpoint)
+            # Resending is only safe while nothing has reached on_text yet
+            if parts or len(tried) >= len(pool.endpoints):
+                raise
+            print(f"Retrying segment on another endpoint after: {e}")
+        finally:
+            pool.release(endpoint)
+    if done is None:
+        return None
+
+    translation = "".join(parts)
+    if spans:
+        tail = restorer.flush()
+        if tail:
+            on_text(tail)
+        translation = unmask(translation, spans)
+        if restorer.missing():
+            print(f"Warning: the translation lost {restorer.missing()} of {len(spans)} placeholders")
+            done = False # Not worth keeping in the translation memory
+    if cache and done and parts: # Only cache complete generations
+        cache.put(model, direction, prompt_prefix, segment, translation)
+    return translation
+
+def _stream_generate(base_url, path, payload, parts, on_text, controller, metrics, prompt_tokens):
+    # Returns whether the server reported the generation as done, or None if aborted
+    done = False
+    started = time.perf_counter()
+    with get_client().post(path, base_url=base_url, json=payload, stream=True) as response:
+        response.raise_for_status()
+        controller.track(response)
+        try:
+            for line in response.iter_lines():
+                if controller['abort']:
+                    return None # Leave the segment unfinished; closing drops the connection
+
+                if line:
+                    try:
+                        chunk = json.loads(line.decode('utf-8'))
+                        # /api/generate streams 'response', /api/chat 'message'
+                        response_part = chunk.get('response') or chunk.get('message', {}).get('content', '')
+                        if response_part:
+                            parts.append(response_part)
+                            if metrics:
+                                metrics.on_text()
+                            on_text(response_part)
+
+                        # Generation is done (Ollama specific); the stream ends right
+                        # after, and reading it to the end keeps the connection reusable.
+                        if chunk.get('done', False):
+                            # Cut off by num_predict: keep the text, but do not cache it
+                            done = chunk.get('done_reason') != "length"
+                            if not done:
+                                print(f"Warning: generation stopped at num_predict ({payload['options']['num_predict']} tokens)")
+                            if metrics:
+                                metrics.add_generation(chunk, time.perf_counter() - started, prompt_tokens)
+                    except json.JSONDecodeError:
+                        print(f"Warning: Could not decode JSON line: {line}")
+                        continue # Skip malformed lines
+        except Exception:
+            if controller['abort']:
+                return None # The stream was shut down by AbortController.abort()
+            raise
+        finally:
+            controller.untrack(response)
+    return done
+
+def _run_concurrently(tasks, workers, controller, on_progress=None):
+    # Runs the zero-argument callables in tasks on a thread pool, reporting
+    # on_progress(completed, total); the first error aborts the rest.
+    workers = workers or get_endpoint_pool().capacity()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+        futures = [pool.submit(task) for task in tasks]
+        try:
+            for completed, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if on_progress:
+                    on_progress(completed, len(tasks))
+        except BaseException:
+            controller.abort() # Stop the remaining workers
+            raise
+
+def translate_text(text, model, direction, on_text, controller, cache=None,
+                   workers=None, on_progress=None, metrics=None, keep_alive=MODEL_KEEP_ALIVE, document=None):
+    """Translate text segment by segment on a pool of worker threads.
+
+    Segments run concurrently (workers defaults to the capacity of the
+    healthy endpoints) but their text reaches on_text in document order.
+    on_progress(completed, total) is called as segments finish, and
+    metrics (a TranslationMetrics) collects timings if given. If document
+    (a TranslationDocument of text) is given, it receives the translations
+    for a later retranslate(). Returns the number of segments.
+    """
+    prompt_prefix = build_prompt_prefix(direction)
+    segments = document.segments if document is not None else split_into_segments(text, segment_chars_for(model, direction))
+    translations = document.translations if document is not None else [None] * len(segments)
+    writer = OrderedChunkWriter(len(segments), on_text)
+
+    def run(index, segment, separator):
+        if not segment.strip():
+            translation, trailer = segment, segment + separator # Nothing to translate
+        else:
+            translation = translate_segment(model, direction, prompt_prefix, segment,
+                                            lambda part: writer.write(index, part), controller, cache, metrics,
+                                            keep_alive, rolling_context(segments, translations, index))
+            if translation is None:
+                return
+            trailer = separator
+        translations[index] = translation
+        writer.finish(index, trailer)
+
+    _run_concurrently([lambda i=index, seg=segment, sep=separator: run(i, seg, sep)
+                       for index, (segment, separator) in enumerate(segments)], workers, controller, on_progress)
+    return len(segments)
+
+def _split_batch_translation(translation, count):
+    # The pieces after the markers [1]..[count], or None if any are missing or out of order
+    parts = BATCH_MARKER_RE.split(translation)
+    if parts[0].strip() or len(parts) != 2 * count + 1:
+        return None
+    if [int(number) for number in parts[1::2]] != list(range(1, count + 1)):
+        return None
+    return [part.strip() for part in parts[2::2]]
+
+def translate_batch(texts, model, direction, controller, cache=None, metrics=None, keep_alive=MODEL_KEEP_ALIVE):
+    """Translate several short texts with a single generation.
+
+    Texts found in the translation memory are not sent. The rest go out as
+    one numbered request; if the reply does not keep the markers, each text
+    is translated on its own instead. Each text should be a single paragraph
+    of at most BATCH_MAX_CHARS. Returns the translations in order, or None
+    if the controller was aborted.
+    """
+    prompt_prefix = build_prompt_prefix(direction)
+    translations = [None] * len(texts)
+    missing = []
+    for i, text in enumerate(texts):
+        if MASK_SPANS and is_untranslatable(mask_segment(text)[0]):
+            if metrics:
+                metrics.add_skipped_segment(estimate_tokens(text))
+            translations[i] = text
+            continue
+        cached = cache.get(model, direction, prompt_prefix, text) if cache else None
+        if cached is not None:
+            if metrics:
+                metrics.on_text(streamed=False)
+                metrics.add_cached_segment()
+            translations[i] = cached
+        else:
+            missing.append(i)
+
+    if len(missing) > 1:
+        batch = "\n\n".join(f"[{number}] {texts[i]}" for number, i in enumerate(missing, start=1))
+        reply = translate_segment(model, direction, build_batch_prompt_prefix(direction), batch, lambda part: None,
+                                  controller, None, metrics, keep_alive)
+        if reply is None:
+            return None
+        parts = _split_batch_translation(reply, len(missing))
+        if parts is not None:
+            for i, translation in zip(missing, parts):
+                translations[i] = translation
+                if cache:
+                    cache.put(model, direction, prompt_prefix, texts[i], translation)
+            return translations
+        print(f"Warning: batch reply lost its markers, translating {len(missing)} texts one by one")
+
+    def run(i):
+        translations[i] = translate_segment(model, direction, prompt_prefix, texts[i], lambda part: None,
+                                            controller, cache, metrics, keep_alive)
+
+    _run_concurrently([lambda i=i: run(i) for i in missing], None, controller)
+    if controller['abort']:
+        return None
+    return translations
+
+# --- Incremental Re-translation ---
+class TranslationDocument:
+    """A text split into segments, with the translation of each once known.
+
+    Keeps the last translated text so that an edited version can be lined up
+    against it (diff()) and only new or changed paragraphs are sent again
+    (retranslate()). The translated text is the concatenation of every
+    translation followed by its segment's separator.
+    """
+    def __init__(self, model, direction, text):
+        self.model = model
+        self.direction = direction
+        # Built on the UI thread, so only model information already known is used
+        self.segments = split_into_segments(text, segment_chars_for(model, direction, fetch=False))
+        # Whitespace-only segments are their own translation
+        self.translations = [segment if not segment.strip() else None for segment, _ in self.segments]
+
+    def complete(self):
+        return all(translation is not None for translation in self.translations)
+
+    def pending(self):
+        return [index for index, translation in enumerate(self.translations) if translation is None]
+
+    def text(self):
+        return "".join(translation + separator
+                       for translation, (_, separator) in zip(self.translations, self.segments))
+
+    def diff(self, text):
+        """Line text up against this document.
+
+        Returns (document, opcodes): a TranslationDocument of text whose
+        unchanged segments already carry their translation, and the
+        difflib opcodes turning this document's segments into the new ones.
+        Segments that moved or only changed their separator keep their
+        translation too.
+        """
+        document = TranslationDocument(self.model, self.direction, text)
+        matcher = difflib.SequenceMatcher(None, self.segments, document.segments, autojunk=False)
+        opcodes = matcher.get_opcodes()
+        known = {segment: translation for (segment, _), translation in zip(self.segments, self.translations)
+                 if translation is not None}
+        for tag, i1, i2, j1, j2 in opcodes:
+            for offset, index in enumerate(range(j1, j2)):
+                if tag == 'equal':
+                    document.translations[index] = self.translations[i1 + offset]
+                else:
+                    segment = document.segments[index][0]
+                    document.translations[index] = segment if not segment.strip() else known.get(segment)
+        return document, opcodes
+
+def retranslate(document, on_text, controller, cache=None, workers=None, on_progress=None, metrics=None,
+                keep_alive=MODEL_KEEP_ALIVE):
+    """Translate the segments of document that have no translation yet.
+
+    Unlike translate_text the segments are not joined into one stream:
+    on_text(index, text) receives the pieces of each segment as they arrive,
+    so the caller can patch them into place. Returns the number of segments
+    translated.
+    """
+    prompt_prefix = build_prompt_prefix(document.direction)
+    pending = document.pending()
+    if metrics:
+        metrics.add_reused_segments(len(document.segments) - len(pending))
+
+    def run(index):
+        segment = document.segments[index][0]
+        context = rolling_context(document.segments, document.translations, index)
+        translation = translate_segment(document.model, document.direction, prompt_prefix, segment,
+                                        lambda part: on_text(index, part), controller, cache, metrics, keep_alive,
+                                        context)
+        if translation is not None:
+            document.translations[index] = translation
+
+    if pending:
+        _run_concurrently([lambda i=index: run(i) for index in pending], workers, controller, on_progress)
+    return len(pending)
+
+# --- Draft and Refine ---
+def translate_with_draft(document, draft_model, on_draft, on_refined, controller, cache=None, workers=None,
+                         on_progress=None, metrics=None, keep_alive=MODEL_KEEP_ALIVE):
+    """Translate document twice at once: quickly with draft_model, properly with document.model.
+
+    on_draft(index, text) receives the streamed pieces of the draft, and
+    on_refined(index, translation) each finished translation of the main
+    model, which should replace that segment's draft. Once a segment is
+    refined no more draft text arrives for it. Draft errors are only
+    reported, since the refined result does not depend on them. metrics
+    covers the main model; its time to first token is that of the draft.
+    Returns the number of segments translated.
+    """
+    prompt_prefix = build_prompt_prefix(document.direction)
+    pending = document.pending()
+    if metrics:
+        metrics.add_reused_segments(len(document.segments) - len(pending))
+    if not pending:
+        return 0
+    draft_controller = AbortController() # Stopped as soon as every segment is refined
+    refined = set()
+    lock = threading.Lock()
+
+    def emit_draft(index, part):
+        with lock:
+            if index in refined:
+                return
+            if metrics:
+                metrics.on_text(streamed=False)
+            on_draft(index, part)
+
+    def draft(index):
+        if index in refined or controller['abort']:
+            return
+        translate_segment(draft_model, document.direction, prompt_prefix, document.segments[index][0],
+                          lambda part: emit_draft(index, part), draft_controller, cache, None, keep_alive)
+
+    def run_drafts():
+        try:
+            _run_concurrently([lambda i=index: draft(i) for index in pending], workers, draft_controller)
+        except Exception as e:
+            print(f"Draft translation with {draft_model} failed: {e}")
+
+    def refine(index):
+        context = rolling_context(document.segments, document.translations, index)
+        translation = translate_segment(document.model, document.direction, prompt_prefix,
+                                        document.segments[index][0], lambda part: None, controller, cache,
+                                        metrics, keep_alive, context)
+        if translation is not None:
+            with lock:
+                document.translations[index] = translation
+                refined.add(index)
+                on_refined(index, translation)
+
+    draft_thread = threading.Thread(target=run_drafts, daemon=True)
+    draft_thread.start()
+    try:
+        _run_concurrently([lambda i=index: refine(i) for index in pending], workers, controller, on_progress)
+    finally:
+        draft_controller.abort()
+        draft_thread.join()
+    return len(pending)
+
+# --- File Translation ---
+def _last_break(text, pattern):
+    last = None
+    for last in pattern.finditer(text):
+        pass
+    return last.end() if last else 0
+
+def iter_text_blocks(f, block_chars=FILE_BLOCK_CHARS):
+    """Yield the open text file f in pieces of roughly block_chars characters.
+
+    Pieces end after a paragraph break where possible, otherwise after a
+    sentence, so no segment is cut in half. Joined, they give back the file.
+    """
+    pending = ""
+    while True:
+        data = f.read(block_chars)
+        pending += data
+        if not data:
+            if pending:
+                yield pending
+            return
+        cut = _last_break(pending, PARAGRAPH_BREAK_RE) or _last_break(pending, SENTENCE_BREAK_RE)
+        if not cut and len(pending) >= 4 * block_chars:
+            cut = len(pending) # No break anywhere; keep memory bounded
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+
+def translate_file(source, destination, model, direction, controller, cache=None, workers=None,
+                   metrics=None, keep_alive=MODEL_KEEP_ALIVE, on_text=None, on_progress=None):
+    """Translate source into destination block by block, without holding either file in memory.
+
+    Text is written to destination + ".part" as it arrives and the file is
+    renamed when complete. on_text receives the same text (e.g. for a preview)
+    and on_progress(bytes_read, total_bytes) follows the source file.
+    Returns True when finished, False if cancelled.
+    """
+    total_bytes = os.path.getsize(source)
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    partial = destination + ".part"
+    with open(source, 'r', encoding='utf-8') as src, open(partial, 'w', encoding='utf-8') as out:
+        def sink(text):
+            out.write(text)
+            if on_text:
+                on_text(text)
+
+        for block in iter_text_blocks(src):
+            translate_text(block, model, direction, on_text=sink, controller=controller, cache=cache,
+                           workers=workers, metrics=metrics, keep_alive=keep_alive)
+            if controller['abort']:
+                return False
+            if on_progress:
+                on_progress(min(src.buffer.tell(), total_bytes), total_bytes)
+    os.replace(partial, destination)
+    return True
+
+# --- Large Documents ---
+NON_BLANK_RE = re.compile(r'\S')
+
+class TextStore:
+    """Text kept outside Tk, for documents too large for a Text widget.
+
+    The text is held as a list of chunks with their start offsets: length
+    and emptiness checks are O(1), any range is found by bisection, and the
+    whole text can be written out chunk by chunk without being joined.
+    Small appended pieces (streamed output) are collected into chunks of
+    about chunk_chars characters.
+    """
+    def __init__(self, chunk_chars=FILE_BLOCK_CHARS):
+        self.chunk_chars = chunk_chars
+        self._chunks = []
+        self._starts = []
+        self._tail = [] # Appended pieces not yet joined into a chunk
+        self._tail_chars = 0
+        self._length = 0
+        self._first_text = None # Offset of the first non-whitespace character
+
+    def __len__(self):
+        return self._length
+
+    def is_blank(self):
+        return self._first_text is None
+
+    def append(self, text):
+        if not text:
+            return
+        if self._first_text is None:
+            match = NON_BLANK_RE.search(text)
+            if match:
+                self._first_text = self._length + match.start()
+        self._tail.append(text)
+        self._tail_chars += len(text)
+        self._length += len(text)
+        if self._tail_chars >= self.chunk_chars:
+            self._starts.append(self._length - self._tail_chars)
+            self._chunks.append("".join(self._tail))
+            self._tail = []
+            self._tail_chars = 0
+
+    def _all_chunks(self):
+        if len(self._tail) > 1:
+            self._tail = ["".join(self._tail)]
+        if self._tail:
+            return self._starts + [self._length - self._tail_chars], self._chunks + self._tail
+        return self._starts, self._chunks
+
+    def read(self, start, end):
+        """The characters from start up to end."""
+        start, end = max(0, start), min(end, self._length)
+        if start >= end:
+            return ""
+        starts, chunks = self._all_chunks()
+        index = bisect.bisect_right(starts, start) - 1
+        pieces = []
+        while index < len(chunks) and starts[index] < end:
+            chunk_start = starts[index]
+            pieces.append(chunks[index][max(0, start - chunk_start):end - chunk_start])
+            index += 1
+        return "".join(pieces)
+
+    def chunks(self):
+        return iter(self._all_chunks()[1])
+
+    def write_to(self, f):
+        for chunk in self.chunks():
+            f.write(chunk)
+
+    def reader(self):
+        """A file-like reader over the text, e.g. for iter_text_blocks()."""
+        return TextStoreReader(self)
+
+class TextStoreReader:
+    def __init__(self, store):
+        self.store = store
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.store) if size is None or size < 0 else self.position + size
+        text = self.store.read(self.position, end)
+        self.position += len(text)
+        return text
+
+    def tell(self):
+        return self.position
+
+# --- Job Scheduling ---
+PRIORITY_INTERACTIVE = 0 # Text typed into the window
+PRIORITY_BACKGROUND = 10 # Whole files
+
+class TextTail(deque):
+    """A queue of streamed text pieces holding at most max_chars characters.
+
+    Appending drops the oldest pieces beyond that, so only the tail of the
+    text is kept however large the pieces are.
+    """
+    def __init__(self, max_chars):
+        super().__init__()
+        self.max_chars = max_chars
+        self._chars = 0
+        self._lock = threading.Lock() # Appended by workers, drained by the UI thread
+
+    def append(self, text):
+        text = text[-self.max_chars:]
+        with self._lock:
+            super().append(text)
+            self._chars += len(text)
+            while self._chars > self.max_chars:
+                self._chars -= len(super().popleft())
+
+    def popleft(self):
+        with self._lock:
+            text = super().popleft()
+            self._chars -= len(text)
+            return text
+
+class TranslationJob:
+    """One queued translation with its own status, progress and AbortController.
+
+    work(job) does the translation; it should pass job.controller, job.metrics,
+    job.set_progress and job.output.append to the engine. Its return value
+    ends up in job.result.
+    """
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+    _ids = itertools.count(1)
+
+    def __init__(self, name, work, priority=PRIORITY_BACKGROUND, metrics=None, output_limit=None):
+        self.id = next(self._ids)
+        self.name = name
+        self.work = work
+        self.priority = priority
+        self.metrics = metrics
+        self.controller = AbortController()
+        self.status = self.QUEUED
+        self.progress = None # (completed, total) as reported by the engine
+        # Streamed text waiting to be displayed; bounded to output_limit
+        # characters for jobs whose output goes elsewhere and is only previewed
+        self.output = TextTail(output_limit) if output_limit else deque()
+        self.result = None
+        self.error = None # The exception that failed the job
+
+    def set_progress(self, completed, total):
+        self.progress = (completed, total)
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def describe(self):
+        text = f"#{self.id} {self.name} - {self.status}"
+        if self.status == self.RUNNING and self.progress and self.progress[1] > 1:
+            text += f" {100 * self.progress[0] // self.progress[1]}%"
+        elif self.status == self.FAILED and self.error:
+            text += f": {self.error}"
+        return text
+
+class TranslationScheduler:
+    """Runs TranslationJobs by priority (lowest first), at most max_concurrent at a time.
+
+    One slot is kept free of background jobs whenever max_concurrent > 1, so
+    interactive jobs never wait behind long documents. on_change(job) is
+    called from whichever thread changed a job's status.
+    """
+    def __init__(self, max_concurrent=2, on_change=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._queue = [] # heap of (priority, id, job)
+        self._running = set()
+        self._jobs = []
+
+    def submit(self, job):
+        with self._lock:
+            self._jobs.append(job)
+            heapq.heappush(self._queue, (job.priority, job.id, job))
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job):
+        with self._lock:
+            was_queued = job.status == job.QUEUED
+            if was_queued:
+                job.status = job.CANCELLED # Skipped when it reaches the head of the queue
+        job.controller.abort()
+        if was_queued:
+            self._notify(job)
+
+    def cancel_all(self):
+        for job in self.jobs():
+            if not job.finished:
+                self.cancel(job)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def clear_finished(self):
+        with self._lock:
+            self._jobs = [job for job in self._jobs if not job.finished]
+
+    def _can_start(self, job):
+        if len(self._running) >= self.max_concurrent:
+            return False
+        if job.priority > PRIORITY_INTERACTIVE and self.max_concurrent > 1:
+            background = sum(1 for running in self._running if running.priority > PRIORITY_INTERACTIVE)
+            return background < self.max_concurrent - 1
+        return True
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while self._queue:
+                job = self._queue[0][2]
+                if job.status == job.CANCELLED:
+                    heapq.heappop(self._queue)
+                    continue
+                if not self._can_start(job):
+                    break
+                heapq.heappop(self._queue)
+                job.status = job.RUNNING
+                self._running.add(job)
+                started.append(job)
+        for job in started:
+            self._notify(job)
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        try:
+            job.result = job.work(job)
+            job.status = job.CANCELLED if job.controller['abort'] else job.DONE
+        except Exception as e:
+            job.error = e
+            job.status = job.CANCELLED if job.controller['abort'] else job.FAILED
+        finally:
+            if job.metrics:
+                job.metrics.finish({job.DONE: "ok", job.CANCELLED: "cancelled"}.get(job.status, "error"))
+            with self._lock:
+                self._running.discard(job)
+            self._notify(job)
+            self._dispatch()
+
+    def _notify(self, job):
+        if self.on_change:
+            self.on_change(job)
@@ -1,16 +1,58 @@
+import os
+import time
+# Startup is measured from here, or from the launch time passed in by the benchmark
+LAUNCHED = float(os.environ.get("OLLAMA_TRANSLATOR_LAUNCH_TIME") or time.time())
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import requests
 import threading
-import json
-import subprocess
-import os
+import sys
+import sqlite3
+
+from ollama_translator_core import (FILE_BLOCK_CHARS, MODEL_KEEP_ALIVE, MODEL_MEMORY_BUDGET_GB, OLLAMA_API_BASE_URL,
+                                    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, MetricsRecorder, TextStore, TranslationCache,
+                                    TranslationDocument, TranslationJob, TranslationMetrics, TranslationScheduler,
+                                    build_prompt_prefix, describe_model_details, format_bytes, format_metrics,
+                                    get_client, get_endpoint_pool, get_model_info, get_model_manager,
+                                    iter_text_blocks, load_model, retranslate, start_local_server, translate_file,
+                                    translate_text, translate_with_draft, unload_model, unload_resident,
+                                    wait_for_server)
+# A lazy module: it is only loaded when an exception class is looked up in an
+# except clause. "import requests" here would load it right away.
+from ollama_translator_core import requests
 
 # Import Style
 from tkinter.ttk import Style
 
-# Default Ollama API endpoint
-OLLAMA_API_BASE_URL = "http://localhost:11434/api"
+# Streamed output is buffered by the worker threads and drawn at most once per
+# this many milliseconds, with a single insert and scroll per frame.
+UI_REFRESH_MS = 30
+
+# Translations that may run at once; one slot is always kept for text typed
+# into the window, so it never waits behind whole files.
+MAX_CONCURRENT_JOBS = 2
+# The job list is redrawn every this many render ticks while a job is shown
+JOB_LIST_REFRESH_TICKS = 15
+
+# In file-to-file mode the output area only shows the last this many characters
+PREVIEW_TAIL_CHARS = 4000
+
+# Files larger than this open in large-document mode: the text stays in a
+# TextStore and the Text widgets only show one page of it at a time.
+LARGE_DOCUMENT_CHARS = 500000
+PAGE_CHARS = 20000
+
+# The window should be drawn within this many milliseconds of launch; slower
+# starts are reported on the console and all are logged to startup.jsonl.
+STARTUP_BUDGET_MS = int(os.environ.get("OLLAMA_TRANSLATOR_STARTUP_BUDGET_MS", "1500"))
+# Set by the benchmark: quit once the model list has loaded
+EXIT_AFTER_STARTUP = bool(os.environ.get("OLLAMA_TRANSLATOR_EXIT_AFTER_STARTUP"))
+
+# Draft model choice meaning "translate with the active model only"
+NO_DRAFT_MODEL = "None"
+
+# Choices for how long an idle model stays loaded on the server
+KEEP_ALIVE_CHOICES = {"5 min": "5m", "30 min": "30m", "2 hours": "2h", "Always": -1, "Unload when idle": 0}
 
 # --- Theme Definitions ---
 LIGHT_THEME = {
@@ -43,6 +85,68 @@ DARK_THEME = {
     "inactive_model_fg": "#aaaaaa"
 }
 
+class PagedTextView:
+    """Shows a TextStore one page at a time in a Text widget, with page buttons.
+
+    While attached, the store holds the real text and the widget only the
+    current page; detached, the widget is an ordinary Text again.
+    """
+    def __init__(self, widget, controls_parent, page_chars=PAGE_CHARS, **grid_options):
+        self.widget = widget
+        self.page_chars = page_chars
+        self.store = None
+        self.page = 0
+        self.frame = ttk.Frame(controls_parent)
+        ttk.Button(self.frame, text="<", width=2, command=lambda: self.show_page(self.page - 1)).pack(side=tk.LEFT)
+        self.label = ttk.Label(self.frame, text="")
+        self.label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.frame, text=">", width=2, command=lambda: self.show_page(self.page + 1)).pack(side=tk.LEFT)
+        self.frame.grid(**grid_options)
+        self.frame.grid_remove()
+
+    def attach(self, store):
+        self.store = store
+        self.frame.grid()
+        self.show_page(0)
+
+    def detach(self):
+        self.store = None
+        self.frame.grid_remove()
+
+    def page_count(self):
+        return max(1, -(-len(self.store) // self.page_chars))
+
+    def show_page(self, page):
+        if self.store is None:
+            return
+        self.page = max(0, min(page, self.page_count() - 1))
+        start = self.page * self.page_chars
+        state = self.widget.cget("state")
+        self.widget.config(state=tk.NORMAL)
+        self.widget.delete('1.0', tk.END)
+        self.widget.insert('1.0', self.store.read(start, start + self.page_chars))
+        self.widget.config(state=state)
+        self._update_label()
+
+    def append(self, text):
+        """Add text to the store; it is drawn if the last page is in view."""
+        following = self.page == self.page_count() - 1
+        self.store.append(text)
+        if not following:
+            self._update_label()
+        elif len(self.store) <= (self.page + 1) * self.page_chars:
+            state = self.widget.cget("state")
+            self.widget.config(state=tk.NORMAL)
+            self.widget.insert(tk.END, text)
+            self.widget.see(tk.END)
+            self.widget.config(state=state)
+            self._update_label()
+        else:
+            self.show_page(self.page_count() - 1) # Move on to the new last page
+
+    def _update_label(self):
+        self.label.config(text=f"Page {self.page + 1}/{self.page_count()} ({len(self.store):,} chars)")
+
 class OllamaTranslatorApp:
     def __init__(self, root):
         self.root = root
@@ -50,7 +154,39 @@ class OllamaTranslatorApp:
         # self.root.geometry("800x600") # Optional: Set initial size
 
         self.active_model = None
-        self.translation_controller = None # To hold the AbortController equivalent
+        self._listed_models = [] # Model names in the order of the Available Models list
+        self._listed_resident = [] # ResidentModels in the order of the Loaded Models list
+        # Translations run as prioritized jobs; the one shown in the output area
+        # is the display job. Its streamed text is drawn by the render tick.
+        self.scheduler = TranslationScheduler(MAX_CONCURRENT_JOBS, on_change=self._on_job_change)
+        self.display_job = None
+        self._job_views = {} # job id -> (placeholder, preview limit)
+        self._job_destinations = {} # job id -> output file of file jobs
+        # Text jobs translate into a TranslationDocument. The last complete one
+        # is what an edited input is diffed against, and _output_document is
+        # the one the output area currently shows, which can be patched in place.
+        self._job_documents = {} # job id -> (document, previous document, opcodes)
+        self.last_document = None
+        self._output_document = None
+        self._patching = False # The display job sends (segment index, text) pieces
+        self._patch_marks = set() # Indexes of the segments that have a mark to insert at
+        self._draft_jobs = set() # Ids of jobs that show a draft model's text first
+        self._large_jobs = {} # job id -> TextStore with the output of a large-document job, kept while listed
+        self._drawn_output = {} # job id -> pieces of a running text job already drawn, replayed when shown again
+        self._drafting = False
+        self._listed_jobs = []
+        self._awaiting_output = False
+        self._render_job = None
+        self._render_ticks = 0
+        self._preview_limit = None # Set while showing a file-to-file job
+        self._preview_chars = 0
+        self.metrics_recorder = MetricsRecorder()
+        try:
+            self.translation_cache = TranslationCache()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Translation cache disabled: {e}")
+            self.translation_cache = None
+        self.service = None # Local HTTP translation service, if enabled
 
         # --- Theme Setup ---
         self.style = Style(root)
@@ -67,11 +203,14 @@ class OllamaTranslatorApp:
         self.translation_frame = ttk.LabelFrame(root, text="Translation", padding="10")
         self.translation_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
 
+        self.jobs_frame = ttk.LabelFrame(root, text="Jobs", padding="10")
+        self.jobs_frame.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
+
         self.progress_frame = ttk.Frame(root, padding="10")
-        self.progress_frame.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
+        self.progress_frame.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
 
         self.footer_frame = ttk.Frame(root, padding="10")
-        self.footer_frame.grid(row=4, column=0, sticky="ew")
+        self.footer_frame.grid(row=5, column=0, sticky="ew")
 
         # Configure grid weights
         self.root.columnconfigure(0, weight=1)
@@ -83,12 +222,15 @@ class OllamaTranslatorApp:
         self.create_header_widgets()
         self.create_model_management_widgets()
         self.create_translation_widgets()
+        self.create_jobs_widgets()
         self.create_progress_widgets()
         self.create_footer_widgets()
 
-        # Initial actions
-        self.start_ollama_server()
-        self.refresh_available_models()
+        # Initial actions run once the window is drawn: finding or starting the
+        # server happens in the background, and the model list loads when it answers.
+        self._startup = {"window_s": None, "server_ready_s": None, "frozen": bool(getattr(sys, "frozen", False))}
+        self.available_models_listbox.insert(tk.END, "Connecting to Ollama...")
+        self.root.after(0, self._window_ready)
 
     # --- Theme Management ---
     def apply_theme(self):
@@ -131,8 +273,11 @@ class OllamaTranslatorApp:
 
         # Apply to existing widgets if they exist
         if hasattr(self, 'input_text'): self.input_text.config(**text_config)
-        if hasattr(self, 'output_text'): self.output_text.config(**text_config)
+        if hasattr(self, 'output_text'):
+            self.output_text.config(**text_config)
+            self.output_text.tag_configure("draft", foreground=theme["disabled_fg"]) # Not yet refined
         if hasattr(self, 'available_models_listbox'): self.available_models_listbox.config(**listbox_config)
+        if hasattr(self, 'jobs_listbox'): self.jobs_listbox.config(**listbox_config)
 
         # Apply specific foreground colors
         if hasattr(self, 'error_label'): self.error_label.config(foreground=theme["error_fg"])
@@ -160,7 +305,7 @@ class OllamaTranslatorApp:
         available_frame = ttk.Frame(self.model_mgmt_frame)
         available_frame.grid(row=0, column=0, padx=5, pady=5, sticky="ns")
         ttk.Label(available_frame, text="Available Models").pack()
-        self.available_models_listbox = tk.Listbox(available_frame, height=5, exportselection=False)
+        self.available_models_listbox = tk.Listbox(available_frame, height=5, width=40, exportselection=False)
         self.available_models_listbox.pack(fill=tk.X, expand=True)
         available_buttons = ttk.Frame(available_frame)
         available_buttons.pack(pady=5)
@@ -173,12 +318,45 @@ class OllamaTranslatorApp:
         ttk.Label(active_frame, text="Active Model for Translation").pack()
         self.active_model_label = ttk.Label(active_frame, text="None selected", foreground="grey", width=30, anchor="center")
         self.active_model_label.pack(pady=5)
+        self.model_state_label = ttk.Label(active_frame, text="", anchor="center")
+        self.model_state_label.pack()
+        keep_alive_frame = ttk.Frame(active_frame)
+        keep_alive_frame.pack(pady=(5, 0))
+        ttk.Label(keep_alive_frame, text="Keep loaded:").pack(side=tk.LEFT, padx=2)
+        default_choice = next((label for label, value in KEEP_ALIVE_CHOICES.items() if str(value) == str(MODEL_KEEP_ALIVE)),
+                              str(MODEL_KEEP_ALIVE))
+        self.keep_alive_var = tk.StringVar(value=default_choice)
+        keep_alive_combo = ttk.Combobox(keep_alive_frame, textvariable=self.keep_alive_var,
+                                        values=list(KEEP_ALIVE_CHOICES), state="readonly", width=15)
+        keep_alive_combo.pack(side=tk.LEFT, padx=2)
+        keep_alive_combo.bind("<<ComboboxSelected>>", self.update_keep_alive)
+        # Optional small model whose rough translation is shown while the active
+        # model works; each paragraph is replaced once the active model has it.
+        draft_frame = ttk.Frame(active_frame)
+        draft_frame.pack(pady=(5, 0))
+        ttk.Label(draft_frame, text="Draft model:").pack(side=tk.LEFT, padx=2)
+        self.draft_model_var = tk.StringVar(value=NO_DRAFT_MODEL)
+        self.draft_model_combo = ttk.Combobox(draft_frame, textvariable=self.draft_model_var,
+                                              values=[NO_DRAFT_MODEL], state="readonly", width=15)
+        self.draft_model_combo.pack(side=tk.LEFT, padx=2)
+        self.draft_model_combo.bind("<<ComboboxSelected>>", self.update_draft_model)
         # Note: No listbox for active models needed, just display the selected one.
         # Adding a deactivate button
         ttk.Button(active_frame, text="Deactivate Model", command=self.deactivate_model).pack(pady=5)
 
+        # Loaded Models Section: what the server holds in memory right now (/api/ps)
+        resident_frame = ttk.Frame(self.model_mgmt_frame)
+        resident_frame.grid(row=0, column=2, padx=5, pady=5, sticky="ns")
+        ttk.Label(resident_frame, text="Loaded Models").pack()
+        self.resident_models_listbox = tk.Listbox(resident_frame, height=5, width=40, exportselection=False)
+        self.resident_models_listbox.pack(fill=tk.X, expand=True)
+        self.memory_label = ttk.Label(resident_frame, text="", anchor="center")
+        self.memory_label.pack()
+        ttk.Button(resident_frame, text="Unload", command=self.unload_selected_model).pack(pady=5)
+
         self.model_mgmt_frame.columnconfigure(0, weight=1)
         self.model_mgmt_frame.columnconfigure(1, weight=1)
+        self.model_mgmt_frame.columnconfigure(2, weight=1)
 
     def create_translation_widgets(self):
         # Input Section
@@ -191,9 +369,11 @@ class OllamaTranslatorApp:
         input_buttons.grid(row=2, column=0, pady=5, sticky="ew")
 
         ttk.Button(input_buttons, text="Upload TXT", command=self.upload_txt).pack(side=tk.LEFT, padx=2)
-        ttk.Button(input_buttons, text="Clear", command=lambda: self.input_text.delete('1.0', tk.END)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(input_buttons, text="Clear", command=self.clear_input).pack(side=tk.LEFT, padx=2)
         self.translate_button = ttk.Button(input_buttons, text="Translate", command=self.start_translation, state=tk.DISABLED)
         self.translate_button.pack(side=tk.LEFT, padx=2)
+        self.translate_file_button = ttk.Button(input_buttons, text="Translate File...", command=self.start_file_translation, state=tk.DISABLED)
+        self.translate_file_button.pack(side=tk.LEFT, padx=2)
         self.cancel_button = ttk.Button(input_buttons, text="Cancel", command=self.cancel_translation, state=tk.DISABLED)
         self.cancel_button.pack(side=tk.LEFT, padx=2)
 
@@ -209,15 +389,30 @@ class OllamaTranslatorApp:
         ttk.Button(output_buttons, text="Save TXT", command=self.save_txt).pack(side=tk.LEFT, padx=2)
         ttk.Button(output_buttons, text="Copy", command=self.copy_to_clipboard).pack(side=tk.LEFT, padx=2)
 
+        # Page controls, only shown in large-document mode
+        self.input_view = PagedTextView(self.input_text, input_frame, row=0, column=0, sticky="e")
+        self.output_view = PagedTextView(self.output_text, output_frame, row=0, column=0, sticky="e")
+
         input_frame.rowconfigure(1, weight=1)
         input_frame.columnconfigure(0, weight=1)
         output_frame.rowconfigure(1, weight=1)
         output_frame.columnconfigure(0, weight=1)
 
+    def create_jobs_widgets(self):
+        self.jobs_listbox = tk.Listbox(self.jobs_frame, height=4, exportselection=False)
+        self.jobs_listbox.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.jobs_listbox.bind("<Double-Button-1>", self.show_selected_job) # Show a running job's output
+        jobs_buttons = ttk.Frame(self.jobs_frame)
+        jobs_buttons.pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Cancel Job", command=self.cancel_selected_job).pack(fill=tk.X, pady=2)
+        ttk.Button(jobs_buttons, text="Clear Finished", command=self.clear_finished_jobs).pack(fill=tk.X, pady=2)
+
     def create_progress_widgets(self):
         ttk.Label(self.progress_frame, text="Progress:").pack(side=tk.LEFT, padx=5)
         self.progress_bar = ttk.Progressbar(self.progress_frame, orient=tk.HORIZONTAL, length=300, mode='determinate')
         self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.metrics_label = ttk.Label(self.progress_frame, text="")
+        self.metrics_label.pack(side=tk.LEFT, padx=5)
         self.error_label = ttk.Label(self.progress_frame, text="", foreground="red")
         self.error_label.pack(side=tk.LEFT, padx=5)
 
@@ -228,29 +423,92 @@ class OllamaTranslatorApp:
         # pass # Remove pass
 
     # --- Helper Methods --- 
-    def start_ollama_server(self):
-        try:
-            # Try to connect to the server first to see if it's already running
-            requests.get(OLLAMA_API_BASE_URL, timeout=1) # Short timeout
+    def _window_ready(self):
+        self.root.update_idletasks() # Finish drawing before taking the time
+        self._startup["window_s"] = round(time.time() - LAUNCHED, 4)
+        window_ms = 1000 * self._startup["window_s"]
+        print(f"Window ready after {window_ms:.0f} ms")
+        if window_ms > STARTUP_BUDGET_MS:
+            print(f"Warning: startup took longer than the {STARTUP_BUDGET_MS} ms budget")
+        threading.Thread(target=self._start_ollama_server_thread, daemon=True).start()
+
+    def _start_ollama_server_thread(self):
+        # Try the configured servers first to see if any is already running
+        pool = get_endpoint_pool()
+        pool.refresh() # Single attempt per endpoint
+        if any(endpoint.healthy for endpoint in pool.endpoints):
             print("Ollama server already running.")
-        except requests.exceptions.RequestException:
+        elif not pool.includes(OLLAMA_API_BASE_URL):
+            # Only remote servers are configured; starting a local one would not help
+            self.root.after(0, self._startup_failed, "Connection Error: Could not connect to any Ollama endpoint.")
+            return
+        else:
             print("Ollama server not running. Attempting to start...")
+            self.root.after(0, self._set_models_placeholder, "Starting Ollama server...")
             try:
-                # For Windows, use CREATE_NO_WINDOW to hide the console
-                # Adjust the command if 'ollama' is not in PATH or has a specific path
-                if os.name == 'nt': # Windows
-                    subprocess.Popen(["ollama", "serve"], creationflags=subprocess.CREATE_NO_WINDOW)
-                else: # macOS/Linux
-                    subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                process = start_local_server()
                 print("Ollama serve command issued.")
-                # It might take a few seconds for the server to start
-                # Consider adding a small delay or a more robust check here if needed
             except FileNotFoundError:
-                self.show_error("Ollama command not found. Ensure Ollama is installed and in your PATH.")
-                messagebox.showerror("Ollama Error", "Ollama command not found. Please ensure Ollama is installed and in your system's PATH.")
+                self.root.after(0, self._startup_failed, "Ollama command not found. Ensure Ollama is installed and in your PATH.",
+                                "Ollama command not found. Please ensure Ollama is installed and in your system's PATH.")
+                return
             except Exception as e:
-                self.show_error(f"Failed to start Ollama server: {e}")
-                messagebox.showerror("Ollama Error", f"Failed to start Ollama server: {e}")
+                self.root.after(0, self._startup_failed, f"Failed to start Ollama server: {e}",
+                                f"Failed to start Ollama server: {e}")
+                return
+            # Poll with backoff instead of guessing how long the server needs
+            if not wait_for_server(process=process):
+                self.root.after(0, self._startup_failed, "Ollama server did not respond. Try Refresh once it is running.")
+                return
+            pool.refresh() # Readmits the local endpoint
+        self._startup["server_ready_s"] = round(time.time() - LAUNCHED, 4)
+        self.root.after(0, self._server_ready)
+
+    def _set_models_placeholder(self, text):
+        self._listed_models = []
+        self.available_models_listbox.delete(0, tk.END)
+        self.available_models_listbox.insert(tk.END, text)
+
+    def _startup_failed(self, message, dialog=None):
+        self._set_models_placeholder("Server not available.")
+        self.show_error(message)
+        self._record_startup()
+        if EXIT_AFTER_STARTUP:
+            self.root.destroy()
+        elif dialog:
+            messagebox.showerror("Ollama Error", dialog)
+
+    def _server_ready(self):
+        print(f"Ollama server ready after {1000 * self._startup['server_ready_s']:.0f} ms")
+        self._record_startup()
+        self.refresh_available_models()
+        manager = get_model_manager()
+        manager.on_change = lambda manager: self.root.after(0, self._update_resident_models, manager.models())
+        manager.start()
+        self._start_service()
+
+    def _start_service(self):
+        # Imported here so the HTTP server code stays out of the startup path
+        from ollama_translator_service import SERVICE_HOST, SERVICE_PORT, TranslationService
+        if not SERVICE_PORT or self.service is not None:
+            return
+        # Requests without a model use whichever model is active at the time
+        service = TranslationService(lambda: self.active_model, cache=self.translation_cache,
+                                     keep_alive=self.get_keep_alive(), recorder=self.metrics_recorder)
+        try:
+            host, port = service.serve(SERVICE_HOST, SERVICE_PORT)
+        except OSError as e:
+            self.show_error(f"Could not start the translation service on port {SERVICE_PORT}: {e}")
+            return
+        self.service = service
+        print(f"Translation service listening on http://{host}:{port}/translate")
+
+    def _record_startup(self):
+        summary = dict(self._startup, timestamp=round(time.time(), 3), budget_ms=STARTUP_BUDGET_MS)
+        try:
+            self.metrics_recorder.record_startup(summary)
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
 
     def show_error(self, message):
         self.error_label.config(text=message)
@@ -260,47 +518,52 @@ class OllamaTranslatorApp:
     def clear_error(self):
         self.error_label.config(text="")
 
+    def has_input(self):
+        # Neither check copies the text: the store tracks it, and the widget
+        # search stops at the first non-whitespace character.
+        if self.input_view.store is not None:
+            return not self.input_view.store.is_blank()
+        return bool(self.input_text.search(r"\S", "1.0", tk.END, regexp=True))
+
     def update_translate_button_state(self):
-        if self.active_model and self.input_text.get("1.0", "end-1c").strip():
+        if self.active_model and self.has_input():
             self.translate_button.config(state=tk.NORMAL)
         else:
             self.translate_button.config(state=tk.DISABLED)
+        self.translate_file_button.config(state=tk.NORMAL if self.active_model else tk.DISABLED)
 
     # --- Model Management Methods --- 
     def refresh_available_models(self):
         self.clear_error()
-        self.available_models_listbox.delete(0, tk.END)
-        self.available_models_listbox.insert(tk.END, "Loading...")
+        self._set_models_placeholder("Loading...")
         threading.Thread(target=self._fetch_models_thread, daemon=True).start()
 
     def _fetch_models_thread(self):
-        try:
-            response = requests.get(f"{OLLAMA_API_BASE_URL}/tags")
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            data = response.json()
-            models = [m['name'] for m in data.get('models', [])]
-            
-            self.root.after(0, self._update_available_models_list, models)
-
-        except requests.exceptions.ConnectionError:
+        pool = get_endpoint_pool()
+        models = pool.refresh() # Probes every endpoint; unreachable ones are left out
+        if not any(endpoint.healthy for endpoint in pool.endpoints):
             self.root.after(0, self.show_error, "Connection Error: Could not connect to Ollama API.")
-            self.root.after(0, self._update_available_models_list, [])
-        except requests.exceptions.RequestException as e:
-            self.root.after(0, self.show_error, f"API Error: {e}")
-            self.root.after(0, self._update_available_models_list, [])
-        except json.JSONDecodeError:
-             self.root.after(0, self.show_error, "API Error: Invalid JSON response.")
-             self.root.after(0, self._update_available_models_list, [])
-
-    def _update_available_models_list(self, models):
+        if len(pool.endpoints) > 1:
+            print("Endpoints: " + "; ".join(pool.describe()))
+        # Size and quantization from the same /api/tags answers
+        details = {model: describe_model_details(pool.model_details(model)) for model in models}
+        self.root.after(0, self._update_available_models_list, models, details)
+
+    def _update_available_models_list(self, models, details=None):
+        details = details or {}
+        self.draft_model_combo.config(values=[NO_DRAFT_MODEL] + sorted(models))
         self.available_models_listbox.delete(0, tk.END)
+        self._listed_models = sorted(models)
         if models:
-            for model in sorted(models):
-                self.available_models_listbox.insert(tk.END, model)
+            for model in self._listed_models:
+                label = f"{model} ({details[model]})" if details.get(model) else model
+                self.available_models_listbox.insert(tk.END, label)
         else:
             self.available_models_listbox.insert(tk.END, "No models found.")
             if not self.error_label.cget("text"): # Show error only if not already shown by fetch
                  self.show_error("No models available or API error.")
+        if EXIT_AFTER_STARTUP:
+            self.root.after(0, self.root.destroy)
 
     def activate_model(self):
         selection = self.available_models_listbox.curselection()
@@ -308,16 +571,22 @@ class OllamaTranslatorApp:
             messagebox.showwarning("No Selection", "Please select a model from the 'Available Models' list.")
             return
         
-        selected_model = self.available_models_listbox.get(selection[0])
-        if selected_model in ["Loading...", "No models found."]:
+        if selection[0] >= len(self._listed_models):
              messagebox.showwarning("Invalid Selection", "Please wait for models to load or select a valid model.")
              return
+        selected_model = self._listed_models[selection[0]]
+
+        # If a different model is already active, cancel the shown translation. Queued
+        # and background jobs keep the model they were submitted with.
+        if self.active_model and self.active_model != selected_model:
+            job = self.display_job
+            if job is not None and job.priority == PRIORITY_INTERACTIVE:
+                print(f"Switching model from {self.active_model} to {selected_model}. Cancelling job #{job.id}.")
+                self.scheduler.cancel(job)
+            else:
+                print(f"Switching model from {self.active_model} to {selected_model}.")
 
-        # If a different model is already active and a translation might be running, cancel it.
-        if self.active_model and self.active_model != selected_model and self.translation_controller:
-            print(f"Switching model from {self.active_model} to {selected_model}. Cancelling ongoing translation if any.")
-            self.cancel_translation()
-
+        previous_model = self.active_model
         self.active_model = selected_model
         active_fg = LIGHT_THEME["active_model_fg"] if self.current_theme == "light" else DARK_THEME["active_model_fg"]
         self.active_model_label.config(text=self.active_model, foreground=active_fg)
@@ -325,21 +594,123 @@ class OllamaTranslatorApp:
         self.update_translation_prompt() # Update prompt when model changes
         print(f"Activated model: {self.active_model}")
 
+        # Free the previous model and load the new one in the background, so the
+        # first translation does not pay the cold-load cost.
+        if previous_model and previous_model != selected_model:
+            threading.Thread(target=self._unload_model_thread, args=(previous_model,), daemon=True).start()
+        if previous_model != selected_model:
+            self._warm_active_model()
+
     def deactivate_model(self):
+        previous_model = self.active_model
         self.active_model = None
         inactive_fg = LIGHT_THEME["inactive_model_fg"] if self.current_theme == "light" else DARK_THEME["inactive_model_fg"]
         self.active_model_label.config(text="None selected", foreground=inactive_fg)
+        self.model_state_label.config(text="")
         self.update_translate_button_state()
         self.update_translation_prompt()
         print("Deactivated model")
+        if previous_model:
+            threading.Thread(target=self._unload_model_thread, args=(previous_model,), daemon=True).start()
+
+    def get_keep_alive(self):
+        choice = self.keep_alive_var.get()
+        return KEEP_ALIVE_CHOICES.get(choice, choice)
+
+    def update_keep_alive(self, event=None):
+        if self.service:
+            self.service.keep_alive = self.get_keep_alive()
+        # Re-issuing the load request resets the server's idle timer to the new value
+        if self.active_model:
+            self._warm_active_model()
+
+    def get_draft_model(self):
+        draft_model = self.draft_model_var.get()
+        if draft_model == NO_DRAFT_MODEL or draft_model == self.active_model:
+            return None
+        return draft_model
+
+    def update_draft_model(self, event=None):
+        draft_model = self.get_draft_model()
+        if draft_model:
+            print(f"Draft model: {draft_model}")
+            threading.Thread(target=self._warm_model_thread,
+                             args=(draft_model, self.get_keep_alive(), (self.active_model, draft_model)),
+                             daemon=True).start()
+
+    def _warm_active_model(self):
+        self.model_state_label.config(text="Warming up...")
+        threading.Thread(target=self._warm_model_thread,
+                         args=(self.active_model, self.get_keep_alive(), (self.active_model, self.get_draft_model())),
+                         daemon=True).start()
+
+    def _warm_model_thread(self, model, keep_alive, keep=()):
+        # keep: models make_room() must not unload, read on the UI thread
+        # The context window sizes segments and sets num_ctx/num_predict per request
+        info = get_model_info(model, refresh=True)
+        print(f"Model {model}: {info.describe()}, parameters {info.parameters}")
+        # Under a memory budget, least recently used models are unloaded first
+        # so that loading this one does not push the server into swapping.
+        manager = get_model_manager()
+        evicted = manager.make_room(model, keep=keep)
+        if evicted:
+            self.root.after(0, self._update_resident_models, manager.models())
+        try:
+            result = load_model(model, keep_alive)
+            state = f"Ready, {info.describe()}"
+            if result.get('load_duration'):
+                state += f" (loaded in {result['load_duration'] / 1e9:.1f}s)"
+            print(f"Model {model} loaded: {result.get('done_reason', 'ok')}")
+        except requests.exceptions.RequestException as e:
+            state = "Not preloaded"
+            print(f"Could not preload model {model}: {e}")
+        self.root.after(0, self._set_model_state, model, state)
+
+    def _update_resident_models(self, resident):
+        self._listed_resident = resident
+        self.resident_models_listbox.delete(0, tk.END)
+        now = time.time()
+        for model in resident:
+            self.resident_models_listbox.insert(tk.END, model.describe(now))
+        if not resident:
+            self.resident_models_listbox.insert(tk.END, "No models loaded.")
+        used = format_bytes(sum(model.size for model in resident))
+        budget = f" of {MODEL_MEMORY_BUDGET_GB:g} GB budget" if MODEL_MEMORY_BUDGET_GB > 0 else ""
+        self.memory_label.config(text=f"Memory: {used}{budget}")
+
+    def unload_selected_model(self):
+        selection = self.resident_models_listbox.curselection()
+        if not selection or selection[0] >= len(self._listed_resident):
+            messagebox.showwarning("No Selection", "Please select a model from the 'Loaded Models' list.")
+            return
+        resident = self._listed_resident[selection[0]]
+        threading.Thread(target=self._unload_resident_thread, args=(resident,), daemon=True).start()
+
+    def _unload_resident_thread(self, resident):
+        try:
+            unload_resident(resident)
+            print(f"Unloaded model: {resident.name} from {resident.endpoint_url}")
+        except requests.exceptions.RequestException as e:
+            print(f"Could not unload model {resident.name}: {e}")
+        manager = get_model_manager()
+        manager.poll()
+        self.root.after(0, self._update_resident_models, manager.models())
+        self.root.after(0, self._set_model_state, resident.name, "Unloaded")
+
+    def _unload_model_thread(self, model):
+        try:
+            unload_model(model)
+            print(f"Unloaded model: {model}")
+        except requests.exceptions.RequestException as e:
+            print(f"Could not unload model {model}: {e}")
+
+    def _set_model_state(self, model, state):
+        if model == self.active_model: # Ignore results for models switched away from
+            self.model_state_label.config(text=state)
 
     # --- Translation Methods --- 
     def get_translation_prompt(self):
-        direction = self.direction_var.get()
-        source_lang = "German" if direction == "de-en" else "English"
-        target_lang = "English" if direction == "de-en" else "German"
-        # Basic prompt - can be refined
-        return f"Translate the following text from {source_lang} to {target_lang}. Output only the translation, without any introductory phrases or explanations:\n\n"
+        return build_prompt_prefix(self.direction_var.get())
 
     def update_translation_prompt(self, event=None): # event=None allows calling it directly
         # This method could potentially update a label showing the prompt, 
@@ -352,107 +723,478 @@ class OllamaTranslatorApp:
         if not self.active_model:
             messagebox.showerror("Error", "No model selected for translation.")
             return
+        if self.input_view.store is not None:
+            self.start_large_translation(self.input_view.store)
+            return
             
         input_content = self.input_text.get("1.0", "end-1c").strip()
         if not input_content:
             messagebox.showerror("Error", "Input text cannot be empty.")
             return
 
+        model, direction, keep_alive = self.active_model, self.direction_var.get(), self.get_keep_alive()
+        previous = self.last_document
+        draft_model = self.get_draft_model()
+        for used in (model, draft_model):
+            if used:
+                get_model_manager().touch(used) # Least recently used models are unloaded first
+        drafting = False
+        preview = input_content[:30].replace("\n", " ")
+
+        if previous is not None and (previous.model, previous.direction) == (model, direction):
+            # Only paragraphs that were added or changed since the last run are
+            # sent; the output area is patched in place when the job is shown.
+            document, opcodes = previous.diff(input_content)
+
+            def work(job):
+                return retranslate(document, on_text=lambda index, part: job.output.append((index, part)),
+                                   controller=job.controller, cache=self.translation_cache,
+                                   on_progress=job.set_progress, metrics=job.metrics, keep_alive=keep_alive)
+
+            name = f"Update: {preview} ({len(document.pending())} changed)"
+        elif draft_model:
+            # The draft model's text appears in place right away; the active
+            # model's translation replaces it paragraph by paragraph.
+            document, opcodes = TranslationDocument(model, direction, input_content), ()
+            drafting = True
+
+            def work(job):
+                return translate_with_draft(document, draft_model,
+                                            on_draft=lambda index, part: job.output.append((index, part)),
+                                            on_refined=lambda index, text: job.output.append((index, text, True)),
+                                            controller=job.controller, cache=self.translation_cache,
+                                            on_progress=job.set_progress, metrics=job.metrics, keep_alive=keep_alive)
+
+            name = f"Draft+Refine: {preview}"
+        else:
+            document, opcodes = TranslationDocument(model, direction, input_content), None
+
+            def work(job):
+                # Segments are translated concurrently but shown in order as soon as
+                # every segment before them has finished. Workers only fill the job's
+                # buffer; the render tick draws it on the main thread.
+                return translate_text(input_content, model, direction, on_text=job.output.append,
+                                      controller=job.controller, cache=self.translation_cache,
+                                      on_progress=job.set_progress, metrics=job.metrics, keep_alive=keep_alive,
+                                      document=document)
+
+            name = f"Text: {preview}"
+
+        job = TranslationJob(name, work, priority=PRIORITY_INTERACTIVE, metrics=TranslationMetrics(model, direction))
+        self._job_views[job.id] = ("Translating...", None)
+        self._job_documents[job.id] = (document, previous if opcodes else None, opcodes)
+        self._drawn_output[job.id] = []
+        if drafting:
+            self._draft_jobs.add(job.id)
+        self.scheduler.submit(job)
+
+    def start_large_translation(self, store):
+        # Like a file translation, but from and into TextStores: the input is
+        # read block by block and the output is paged in the output area.
+        # Incremental updates and drafts need the whole text as segments in
+        # memory and are not used here.
+        if store.is_blank():
+            messagebox.showerror("Error", "Input text cannot be empty.")
+            return
+        model, direction, keep_alive = self.active_model, self.direction_var.get(), self.get_keep_alive()
+
+        def work(job):
+            reader = store.reader()
+            for block in iter_text_blocks(reader):
+                translate_text(block, model, direction, on_text=job.output.append, controller=job.controller,
+                               cache=self.translation_cache, metrics=job.metrics, keep_alive=keep_alive)
+                if job.controller['abort']:
+                    return False
+                job.set_progress(reader.tell(), len(store))
+            return True
+
+        preview = store.read(0, 30).strip().replace("\n", " ")
+        job = TranslationJob(f"Large text: {preview} ({len(store):,} chars)", work, priority=PRIORITY_INTERACTIVE,
+                             metrics=TranslationMetrics(model, direction))
+        self._job_views[job.id] = ("Translating...", None)
+        self._large_jobs[job.id] = TextStore()
+        self.scheduler.submit(job)
+
+    def start_file_translation(self):
+        # Translates straight from one file into another; the text widgets only
+        # show a preview of the most recent output, so file size does not matter.
+        if not self.active_model:
+            messagebox.showerror("Error", "No model selected for translation.")
+            return
+        source = filedialog.askopenfilename(
+            title="Translate TXT File",
+            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        )
+        if not source:
+            return
+        stem, ext = os.path.splitext(source)
+        target_lang = self.direction_var.get().split("-")[-1]
+        destination = filedialog.asksaveasfilename(
+            title="Save Translation As",
+            initialdir=os.path.dirname(source),
+            initialfile=os.path.basename(f"{stem}.{target_lang}{ext or '.txt'}"),
+            defaultextension=".txt",
+            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        )
+        if not destination:
+            return
+        if os.path.abspath(destination) == os.path.abspath(source):
+            messagebox.showerror("Error", "Choose a different file for the translation.")
+            return
+
+        model, direction, keep_alive = self.active_model, self.direction_var.get(), self.get_keep_alive()
+
+        def work(job):
+            return translate_file(source, destination, model, direction, job.controller,
+                                  cache=self.translation_cache, metrics=job.metrics, keep_alive=keep_alive,
+                                  on_text=job.output.append, on_progress=job.set_progress)
+
+        # Only the tail of a file's output is ever shown, so its buffer keeps
+        # at most as many characters as the preview
+        job = TranslationJob(f"File: {os.path.basename(source)}", work, priority=PRIORITY_BACKGROUND,
+                             metrics=TranslationMetrics(model, direction), output_limit=PREVIEW_TAIL_CHARS)
+        self._job_views[job.id] = (f"Translating {os.path.basename(source)}...", PREVIEW_TAIL_CHARS)
+        self._job_destinations[job.id] = destination
+        self.scheduler.submit(job)
+
+    # --- Job Handling ---
+    def _on_job_change(self, job):
+        # Called from scheduler threads; the UI update is handed to the main loop
+        status = job.status
+        if job.finished and job.metrics and job.metrics.status != "running":
+            self._record_metrics(job.metrics)
+            if self.translation_cache:
+                self.translation_cache.evict()
+                print(f"Translation cache: {self.translation_cache.stats()}")
+            print(f"HTTP connections: {get_client().connection_stats()}")
+        self.root.after(0, self._job_changed, job, status)
+
+    def _job_changed(self, job, status):
+        self._refresh_job_list()
+        if status == job.RUNNING:
+            # Interactive jobs always take over the output area; background jobs
+            # only when nothing else is being shown.
+            if job.priority == PRIORITY_INTERACTIVE or self.display_job is None:
+                self._display_job(job)
+        elif job.finished:
+            self._report_job(job, status)
+            document = self._job_documents.pop(job.id, (None,))[0]
+            self._draft_jobs.discard(job.id)
+            self._drawn_output.pop(job.id, None)
+            large_output = self._large_jobs.get(job.id)
+            if large_output is not None and job is not self.display_job:
+                # Finished while another job was shown; keep it for show_selected_job
+                while job.output:
+                    large_output.append(job.output.popleft())
+            if status == job.DONE and document is not None:
+                self.last_document = document
+            if job is self.display_job:
+                self._finalize_translation()
+                if status == job.DONE and document is not None:
+                    self._output_document = document # The output area now shows exactly this
+
+    def _report_job(self, job, status):
+        if status == job.DONE:
+            print(f"Job #{job.id} finished: {job.name}")
+            destination = self._job_destinations.pop(job.id, None)
+            if destination:
+                messagebox.showinfo("Translation Saved", f"Translation saved to {destination}")
+        elif status == job.CANCELLED:
+            print(f"Job #{job.id} cancelled: {job.name}")
+            if job is self.display_job:
+                self.show_error("Translation cancelled.")
+        elif status == job.FAILED:
+            error = job.error
+            if isinstance(error, requests.exceptions.ConnectionError):
+                message = "Connection Error during translation."
+            elif isinstance(error, requests.exceptions.RequestException):
+                message = f"API Error during translation: {error}"
+            elif isinstance(error, (OSError, UnicodeDecodeError)):
+                message = f"File error during translation: {error}"
+            else:
+                message = f"Unexpected error during translation: {error}"
+                import traceback
+                traceback.print_exception(type(error), error, error.__traceback__)
+            self.show_error(message if job is self.display_job else f"Job #{job.id}: {message}")
+        self._job_views.pop(job.id, None)
+
+    def _display_job(self, job):
+        placeholder, preview_limit = self._job_views.get(job.id, ("Translating...", None))
+        self.display_job = job
         self.clear_error()
+        drawn = self._drawn_output.get(job.id)
+        if drawn:
+            # Shown before and drawn over since: the output area is rebuilt, so
+            # what it had drawn is queued again in front of the newer output
+            job.output.extendleft(reversed(drawn))
+            drawn.clear()
+        document, previous, opcodes = self._job_documents.get(job.id, (None, None, None))
+        self._patching = opcodes is not None
+        self._drafting = job.id in self._draft_jobs
+        large_output = self._large_jobs.get(job.id)
+        self.output_view.detach()
         self.output_text.config(state=tk.NORMAL)
-        self.output_text.delete('1.0', tk.END)
-        self.output_text.insert('1.0', "Translating...")
+        if large_output is not None:
+            self.output_view.attach(large_output) # Shows what was drawn before, if anything
+            if not len(large_output):
+                self.output_text.insert('1.0', placeholder)
+        elif self._patching:
+            self._prepare_patch(document, previous, opcodes)
+        else:
+            self.output_text.delete('1.0', tk.END)
+            self.output_text.insert('1.0', placeholder)
         self.output_text.config(state=tk.DISABLED)
+        self._output_document = None
         
         self.progress_bar['value'] = 0
         self.progress_bar['mode'] = 'indeterminate' # Use indeterminate for streaming
         self.progress_bar.start()
-        
-        self.translate_button.config(state=tk.DISABLED)
         self.cancel_button.config(state=tk.NORMAL)
 
-        # Use threading to avoid blocking the GUI
-        # Simple AbortController simulation
-        self.translation_controller = {'abort': False}
-        threading.Thread(target=self._translate_thread, args=(input_content, self.translation_controller), daemon=True).start()
-
-    def _translate_thread(self, text_to_translate, controller):
+        # The placeholder is replaced by the first rendered text
+        self._awaiting_output = not self._patching and not (large_output is not None and len(large_output))
+        self._preview_limit = preview_limit
+        self._preview_chars = 0
+        self.metrics_label.config(text="")
+        self._schedule_render()
+
+    def _prepare_patch(self, document, previous, opcodes):
+        # Replaces the segments of the shown translation that changed, leaving
+        # the rest of the text alone. Segments still to be translated get a
+        # mark ("seg<index>") that their streamed text is inserted at.
+        widget = self.output_text
+        self._clear_patch_marks()
+        if previous is not None and previous is self._output_document and widget.get('1.0', 'end-1c') == previous.text():
+            offsets = [0]
+            for translation, (_, separator) in zip(previous.translations, previous.segments):
+                offsets.append(offsets[-1] + len(translation) + len(separator))
+            # Back to front, so the offsets of the earlier segments stay valid
+            for tag, i1, i2, j1, j2 in reversed(opcodes):
+                if tag != 'equal':
+                    start = f"1.0 + {offsets[i1]} chars"
+                    widget.delete(start, f"1.0 + {offsets[i2]} chars")
+                    self._insert_segments(document, start, j1, j2)
+        else:
+            # Showing something else; rebuild it from the known translations
+            widget.delete('1.0', tk.END)
+            self._insert_segments(document, '1.0', 0, len(document.segments))
+
+    def _insert_segments(self, document, index, first, last):
+        # The text goes in with one insert and the marks are set afterwards, so
+        # a segment without a separator keeps its mark in front of the next one
+        widget = self.output_text
+        widget.mark_set("patch", index)
+        widget.mark_gravity("patch", "left") # Stays at the start of the inserted text
+        pieces = []
+        ends = [] # (segment index, offset of its end in the inserted text)
+        offset = 0
+        for i in range(first, last):
+            translation = document.translations[i]
+            separator = document.segments[i][1]
+            if translation is None:
+                ends.append((i, offset))
+                translation = ""
+            pieces.append(translation + separator)
+            offset += len(translation) + len(separator)
+        widget.insert("patch", "".join(pieces))
+        for i, end in ends:
+            widget.mark_set(f"seg{i}", f"patch + {end} chars") # Right gravity: text goes in before the separator
+            widget.mark_set(f"segstart{i}", f"seg{i}")
+            widget.mark_gravity(f"segstart{i}", "left") # Stays in front of the segment's text
+            self._patch_marks.add(i)
+        widget.mark_unset("patch")
+
+    def _insert_into_segment(self, index, text, tags=()):
+        # Segments without a separator share their end mark's position with
+        # the marks of empty neighbours, which gravity alone would leave on
+        # the wrong side of the new text; those are put back where they belong.
+        widget = self.output_text
+        end = f"seg{index}"
+        before = []
+        i = index - 1
+        while i in self._patch_marks and widget.compare(f"seg{i}", "==", end):
+            before.append(i)
+            i -= 1
+        after = []
+        i = index + 1
+        while i in self._patch_marks and widget.compare(f"segstart{i}", "==", end):
+            after.append(i)
+            i += 1
+        position = widget.index(end)
+        widget.insert(end, text, tags)
+        for i in before:
+            widget.mark_set(f"seg{i}", position)
+        for i in after:
+            widget.mark_set(f"segstart{i}", end)
+
+    def _clear_patch_marks(self):
+        for index in self._patch_marks:
+            self.output_text.mark_unset(f"seg{index}", f"segstart{index}")
+        self._patch_marks.clear()
+
+    def _refresh_job_list(self):
+        # Only changed rows are replaced and the selected job stays selected,
+        # so Cancel Job and double-click work while progress is redrawn
+        selected = self._selected_job()
+        jobs = self.scheduler.jobs()
+        listbox = self.jobs_listbox
+        for index, job in enumerate(jobs):
+            text = job.describe()
+            if index < listbox.size():
+                if listbox.get(index) == text:
+                    continue
+                listbox.delete(index)
+            listbox.insert(index, text)
+        listbox.delete(len(jobs), tk.END)
+        self._listed_jobs = jobs
+        listbox.selection_clear(0, tk.END)
+        if selected in jobs:
+            listbox.selection_set(jobs.index(selected))
+
+    def _selected_job(self):
+        selection = self.jobs_listbox.curselection()
+        if not selection or selection[0] >= len(self._listed_jobs):
+            return None
+        return self._listed_jobs[selection[0]]
+
+    def cancel_selected_job(self):
+        job = self._selected_job()
+        if job and not job.finished:
+            self.scheduler.cancel(job)
+            print(f"Cancellation requested for job #{job.id}.")
+
+    def show_selected_job(self, event=None):
+        job = self._selected_job()
+        if job and job.status == job.RUNNING and job is not self.display_job:
+            self._display_job(job)
+        elif job and job.finished and job.id in self._large_jobs:
+            self._show_large_output(job)
+
+    def _show_large_output(self, job):
+        # A finished large-document translation, paged from its store again
+        store = self._large_jobs[job.id]
+        if self.output_view.store is store:
+            return
+        if self.display_job is not None:
+            self._finalize_translation() # The running job goes on in the job list
+        self.clear_error()
+        self.output_view.detach()
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete('1.0', tk.END)
+        self.output_view.attach(store)
+        self.output_text.config(state=tk.DISABLED)
+        self._output_document = None
+        if job.metrics:
+            self.metrics_label.config(text=format_metrics(job.metrics.summary()))
+
+    def clear_finished_jobs(self):
+        self.scheduler.clear_finished()
+        self._refresh_job_list()
+        listed = {job.id for job in self._listed_jobs}
+        for job_id in list(self._large_jobs):
+            if job_id not in listed:
+                del self._large_jobs[job_id] # Still readable in the output area if shown there
+
+    def _record_metrics(self, metrics):
+        summary = metrics.summary()
+        print(f"Translation metrics: {summary}")
         try:
-            prompt = self.get_translation_prompt() + text_to_translate
-            payload = {
-                "model": self.active_model,
-                "prompt": prompt,
-                "stream": True # Use streaming API
-            }
-            
-            full_response = ""
-            
-            # Make the streaming request
-            response = requests.post(f"{OLLAMA_API_BASE_URL}/generate", json=payload, stream=True)
-            response.raise_for_status()
-
-            self.root.after(0, lambda: self.output_text.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.output_text.delete('1.0', tk.END))
-
-            for line in response.iter_lines():
-                if controller['abort']:
-                    print("Translation aborted by user.")
-                    self.root.after(0, self.show_error, "Translation cancelled.")
-                    break # Exit the loop if cancelled
-
-                if line:
-                    try:
-                        chunk = json.loads(line.decode('utf-8'))
-                        response_part = chunk.get('response', '')
-                        if response_part:
-                            full_response += response_part
-                            # Update GUI from the main thread
-                            self.root.after(0, lambda p=response_part: self.output_text.insert(tk.END, p))
-                            self.root.after(0, lambda: self.output_text.see(tk.END)) # Scroll to end
-                        
-                        # Check if generation is done (Ollama specific)
-                        if chunk.get('done', False):
-                            break
-                    except json.JSONDecodeError:
-                        print(f"Warning: Could not decode JSON line: {line}")
-                        continue # Skip malformed lines
-            
-            if controller['abort']:
-                 # Ensure final state reflects cancellation
-                 self.root.after(0, lambda: self.output_text.config(state=tk.DISABLED))
-            else:
-                # Final update after stream finishes normally
-                # self.root.after(0, lambda: self.output_text.delete('1.0', tk.END))
-                # self.root.after(0, lambda: self.output_text.insert('1.0', full_response))
-                self.root.after(0, lambda: self.output_text.config(state=tk.DISABLED))
-                print("Translation finished.")
-
-        except requests.exceptions.ConnectionError:
-            self.root.after(0, self.show_error, "Connection Error during translation.")
-        except requests.exceptions.RequestException as e:
-            self.root.after(0, self.show_error, f"API Error during translation: {e}")
-        except Exception as e:
-            self.root.after(0, self.show_error, f"Unexpected error during translation: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            # Always run this cleanup code in the main thread
-            self.root.after(0, self._finalize_translation)
+            self.metrics_recorder.record(summary)
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
+
+    def _schedule_render(self):
+        if self._render_job is None:
+            self._render_job = self.root.after(UI_REFRESH_MS, self._render_tick)
+
+    def _render_tick(self):
+        self._render_job = None
+        self._flush_output()
+        self._render_ticks += 1
+        if self._render_ticks % JOB_LIST_REFRESH_TICKS == 0:
+            self._refresh_job_list() # Keeps progress percentages current
+        if self.display_job is not None:
+            self._schedule_render()
+
+    def _flush_output(self):
+        job = self.display_job
+        if job is None:
+            return
+        # Drain everything buffered since the last frame into one insert
+        pieces = []
+        queue = job.output
+        while queue:
+            pieces.append(queue.popleft())
+        drawn = self._drawn_output.get(job.id)
+        if drawn is not None:
+            drawn.extend(pieces)
+        if pieces and self._patching:
+            self.output_text.config(state=tk.NORMAL)
+            for piece in pieces:
+                index, text = piece[0], piece[1]
+                if index not in self._patch_marks:
+                    continue # Already drawn in full
+                if len(piece) > 2: # The active model's translation replaces the draft
+                    self.output_text.delete(f"segstart{index}", f"seg{index}")
+                    self._insert_into_segment(index, text)
+                else:
+                    self._insert_into_segment(index, text, "draft" if self._drafting else ())
+            self.output_text.config(state=tk.DISABLED)
+        elif pieces and self.output_view.store is not None:
+            if self._awaiting_output:
+                self.output_text.config(state=tk.NORMAL)
+                self.output_text.delete('1.0', tk.END)
+                self.output_text.config(state=tk.DISABLED)
+                self._awaiting_output = False
+            self.output_view.append("".join(pieces))
+        elif pieces:
+            self.output_text.config(state=tk.NORMAL)
+            if self._awaiting_output:
+                self.output_text.delete('1.0', tk.END)
+                self._awaiting_output = False
+            text = "".join(pieces)
+            self.output_text.insert(tk.END, text)
+            if self._preview_limit:
+                # Only keep the tail of the output in the widget
+                self._preview_chars += len(text)
+                if self._preview_chars > 2 * self._preview_limit:
+                    self.output_text.delete('1.0', f"end-{self._preview_limit}c")
+                    self._preview_chars = self._preview_limit
+            self.output_text.see(tk.END) # Scroll to end
+            self.output_text.config(state=tk.DISABLED)
+        if job.progress:
+            self._update_progress(*job.progress)
+        if job.metrics:
+            self.metrics_label.config(text=format_metrics(job.metrics.summary()))
+
+    def _update_progress(self, completed, total):
+        if total <= 1:
+            return # Single segments keep the indeterminate bar
+        if self.progress_bar['mode'] != 'determinate':
+            self.progress_bar.stop()
+            self.progress_bar['mode'] = 'determinate'
+        self.progress_bar['value'] = 100 * completed / total
 
     def _finalize_translation(self):
+        if self._render_job is not None:
+            self.root.after_cancel(self._render_job)
+            self._render_job = None
+        self._flush_output()
         self.progress_bar.stop()
         self.progress_bar['mode'] = 'determinate'
         self.progress_bar['value'] = 100 if not self.error_label.cget("text") else 0
-        self.translate_button.config(state=tk.NORMAL if self.active_model else tk.DISABLED)
         self.cancel_button.config(state=tk.DISABLED)
-        self.translation_controller = None # Reset controller
+        if self._patching:
+            self._clear_patch_marks()
+            self._patching = False
+        self.display_job = None
         self.update_translate_button_state() # Re-check state based on input text
 
     def cancel_translation(self):
-        if self.translation_controller:
-            self.translation_controller['abort'] = True
+        if self.display_job:
+            self.scheduler.cancel(self.display_job)
             print("Cancellation requested.")
-            # The thread will check the flag and stop
+            # Open streams are shut down, so the server stops generating right away
             self.cancel_button.config(state=tk.DISABLED) # Prevent multiple clicks
 
     # --- File I/O Methods --- 
@@ -465,16 +1207,44 @@ class OllamaTranslatorApp:
             return
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self.input_text.delete('1.0', tk.END)
-            self.input_text.insert('1.0', content)
+                if os.path.getsize(filepath) > LARGE_DOCUMENT_CHARS:
+                    # Too large for the widget: keep it in a store and page through it
+                    store = TextStore()
+                    for block in iter(lambda: f.read(FILE_BLOCK_CHARS), ""):
+                        store.append(block)
+                    content = None
+                else:
+                    content = f.read()
+            self.clear_input()
+            if content is None:
+                self.input_text.config(state=tk.DISABLED) # Edits of a page could not be kept
+                self.input_view.attach(store)
+                print(f"Large-document mode: {len(store):,} characters")
+            else:
+                self.input_text.insert('1.0', content)
             self.update_translate_button_state()
             self.clear_error()
         except Exception as e:
             messagebox.showerror("File Read Error", f"Could not read file: {e}")
             self.show_error(f"Error reading file: {filepath}")
 
+    def clear_input(self):
+        self.input_view.detach() # A running job keeps its own reference to the store
+        self.input_text.config(state=tk.NORMAL)
+        self.input_text.delete('1.0', tk.END)
+        self.update_translate_button_state()
+
+    def _output_store(self):
+        # The output of a large-document job, unless it is still only the placeholder
+        store = self.output_view.store
+        if store is None or store.is_blank():
+            return None
+        return store
+
     def save_txt(self):
+        if self.output_view.store is not None:
+            self._save_store(self._output_store())
+            return
         output_content = self.output_text.get("1.0", "end-1c").strip()
         if not output_content or output_content == "Translating...":
             messagebox.showwarning("No Output", "There is no translated text to save.")
@@ -495,7 +1265,41 @@ class OllamaTranslatorApp:
             messagebox.showerror("File Save Error", f"Could not save file: {e}")
             self.show_error(f"Error saving file: {filepath}")
 
+    def _save_store(self, store):
+        if store is None:
+            messagebox.showwarning("No Output", "There is no translated text to save.")
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Save Translation As",
+            defaultextension=".txt",
+            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        )
+        if not filepath:
+            return
+        try:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                store.write_to(f) # Chunk by chunk, never joined into one string
+            self.clear_error()
+        except Exception as e:
+            messagebox.showerror("File Save Error", f"Could not save file: {e}")
+            self.show_error(f"Error saving file: {filepath}")
+
     def copy_to_clipboard(self):
+        if self.output_view.store is not None:
+            store = self._output_store()
+            if store is None:
+                messagebox.showwarning("No Output", "There is no translated text to copy.")
+                return
+            try:
+                self.root.clipboard_clear()
+                for chunk in store.chunks():
+                    self.root.clipboard_append(chunk)
+                messagebox.showinfo("Copied", "Output copied to clipboard.")
+                self.clear_error()
+            except tk.TclError:
+                messagebox.showwarning("Clipboard Error", "Could not access clipboard.")
+                self.show_error("Clipboard access error.")
+            return
         output_content = self.output_text.get("1.0", "end-1c").strip()
         if not output_content or output_content == "Translating...":
             messagebox.showwarning("No Output", "There is no translated text to copy.")
@@ -1,16 +1,23 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# Startup budget: the window must be drawn within 1500 ms of launch. Check a
+# build with
+#     python ollama_translator_bench.py --mode startup --executable dist/ollama_translator_gui
+# which exits non-zero when the budget is exceeded; every start of the
+# application is also logged to ~/.ollama_translator/startup.jsonl.
+# UPX is off because decompressing at every launch costs more start time than
+# the smaller download saves, and modules the application never uses are left out.
 
 a = Analysis(
     ['ollama_translator_gui.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['requests'], # Imported lazily by ollama_translator_core
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['unittest', 'pydoc', 'pydoc_data', 'doctest', 'lib2to3', 'tkinter.test', 'test'],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +33,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
@@ -0,0 +1,340 @@
+"""Local HTTP translation service on top of the translator engine.
+
+Other tools can send text to the same prompts, segmentation, model settings
+and translation memory the GUI uses:
+
+    python ollama_translator_service.py --model llama3 --port 8765
+    curl -s localhost:8765/translate -d '{"text": "Guten Morgen!", "direction": "de-en"}'
+
+POST /translate takes {"text", "model", "direction"} (model and direction
+default to the service's) and answers {"translation", "model", "direction",
+"shared"}. GET /health reports the model and request counters.
+
+Identical requests that arrive while one is being translated wait for that
+translation instead of starting their own (single-flight), and short
+single-paragraph requests arriving within BATCH_WINDOW_MS of each other are
+sent to the model together as one batch. The GUI runs the same service for
+its active model when OLLAMA_TRANSLATOR_SERVICE_PORT is set.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ollama_translator_core import (BATCH_MAX_CHARS, BATCH_MAX_ITEMS, MODEL_KEEP_ALIVE, PARAGRAPH_BREAK_RE,
+                                    AbortController, MetricsRecorder, TranslationCache, TranslationMetrics,
+                                    get_endpoint_pool, translate_batch, translate_text)
+
+# --- Service Settings ---
+# Only reachable from this machine unless another host is given
+SERVICE_HOST = os.environ.get("OLLAMA_TRANSLATOR_SERVICE_HOST", "127.0.0.1")
+# 0 keeps the service off in the GUI
+SERVICE_PORT = int(os.environ.get("OLLAMA_TRANSLATOR_SERVICE_PORT") or 0)
+DEFAULT_SERVICE_PORT = 8765
+# How long a short request waits for others to share its batch
+BATCH_WINDOW_MS = int(os.environ.get("OLLAMA_TRANSLATOR_BATCH_WINDOW_MS", "20"))
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+DIRECTIONS = ("de-en", "en-de")
+
+# --- Coalescing ---
+class _Call:
+    # The outcome of one translation, for every caller waiting on it
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def resolve(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.event.set()
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """Runs one call per key at a time; callers with the same key meanwhile get its result."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Returns (result, shared), where shared tells whether another caller's call produced it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            return call.wait(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            error = e
+            raise
+        else:
+            error = None
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.resolve(None if error else result, error)
+        return result, False
+
+class MicroBatcher:
+    """Collects items per key for window seconds (or until max_items) and runs them as one batch.
+
+    run_batch(key, items) returns one result per item; submit() blocks until
+    its item's result is known.
+    """
+    def __init__(self, run_batch, window=BATCH_WINDOW_MS / 1000, max_items=BATCH_MAX_ITEMS):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._pending = {} # key -> [(item, call)] still collecting
+
+    def submit(self, key, item):
+        call = _Call()
+        with self._lock:
+            batch = self._pending.setdefault(key, [])
+            batch.append((item, call))
+            if len(batch) == 1:
+                timer = threading.Timer(self.window, self._flush, (key, batch))
+                timer.daemon = True
+                timer.start()
+            full = len(batch) >= self.max_items
+            if full:
+                del self._pending[key]
+        if full:
+            self._run(key, batch) # The caller that filled the batch runs it
+        return call.wait()
+
+    def _flush(self, key, batch):
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return # Already run when it filled up
+            del self._pending[key]
+        self._run(key, batch)
+
+    def _run(self, key, batch):
+        try:
+            results = self.run_batch(key, [item for item, _ in batch])
+        except BaseException as e:
+            for _, call in batch:
+                call.resolve(error=e)
+        else:
+            for (_, call), result in zip(batch, results):
+                call.resolve(result)
+
+# --- Service ---
+class TranslationService:
+    """Translates requests from other programs through the shared engine.
+
+    model is a model name or a callable returning the current one (the GUI's
+    active model), used when a request names none.
+    """
+    def __init__(self, model=None, direction="de-en", cache=None, keep_alive=MODEL_KEEP_ALIVE, recorder=None,
+                 batch_window=BATCH_WINDOW_MS / 1000):
+        self.model = model
+        self.direction = direction
+        self.cache = cache
+        self.keep_alive = keep_alive
+        self.recorder = recorder
+        self.single_flight = SingleFlight()
+        self.batcher = MicroBatcher(self._run_batch, window=batch_window)
+        self.server = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "shared": 0, "batched": 0, "batches": 0, "model_calls": 0, "errors": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def default_model(self):
+        return self.model() if callable(self.model) else self.model
+
+    def translate(self, text, model=None, direction=None):
+        """Returns (translation, shared); raises ValueError for requests that cannot be served."""
+        model = model or self.default_model()
+        direction = direction or self.direction
+        if not model:
+            raise ValueError("No model selected")
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction!r}, expected one of {', '.join(DIRECTIONS)}")
+        self._count("requests")
+        try:
+            translation, shared = self.single_flight.do((model, direction, text),
+                                                       lambda: self._translate(text, model, direction))
+        except Exception:
+            self._count("errors")
+            raise
+        if shared:
+            self._count("shared")
+        return translation, shared
+
+    def _translate(self, text, model, direction):
+        if not text.strip():
+            return text
+        segment = text.strip()
+        if len(segment) <= BATCH_MAX_CHARS and not PARAGRAPH_BREAK_RE.search(segment):
+            # Keeps the surrounding whitespace, which the batch reply loses
+            leading = text[:len(text) - len(text.lstrip())]
+            trailing = text[len(text.rstrip()):]
+            return leading + self.batcher.submit((model, direction), segment) + trailing
+        parts = []
+        metrics = TranslationMetrics(model, direction)
+        self._count("model_calls")
+        translate_text(text, model, direction, on_text=parts.append, controller=AbortController(), cache=self.cache,
+                       metrics=metrics, keep_alive=self.keep_alive)
+        self._record(metrics)
+        return "".join(parts)
+
+    def _run_batch(self, key, texts):
+        model, direction = key
+        metrics = TranslationMetrics(model, direction)
+        self._count("batches")
+        self._count("batched", len(texts))
+        self._count("model_calls")
+        translations = translate_batch(texts, model, direction, AbortController(), cache=self.cache,
+                                       metrics=metrics, keep_alive=self.keep_alive)
+        self._record(metrics)
+        return translations
+
+    def _record(self, metrics):
+        metrics.finish("ok")
+        if self.recorder:
+            try:
+                self.recorder.record(metrics.summary())
+            except OSError as e:
+                print(f"Could not write metrics: {e}")
+
+    def health(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return {"status": "ok", "model": self.default_model(), "direction": self.direction, "stats": stats}
+
+    def serve(self, host=SERVICE_HOST, port=DEFAULT_SERVICE_PORT):
+        """Start answering HTTP requests on a background thread; returns the bound (host, port)."""
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[:2]
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass # Requests are counted in /health instead
+
+            def _send_json(self, status, obj):
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send_json(200, service.health())
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/translate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._send_json(400, {"error": "Content-Length must be a non-negative integer"})
+                    return
+                if length > MAX_REQUEST_BYTES:
+                    self._send_json(413, {"error": "request too large"})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+                    text = request["text"]
+                    if not isinstance(text, str):
+                        raise TypeError("text must be a string")
+                    model = request.get("model")
+                    direction = request.get("direction")
+                    for name, value in (("model", model), ("direction", direction)):
+                        if value is not None and not isinstance(value, str):
+                            raise TypeError(f"{name} must be a string")
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    self._send_json(400, {"error": f"Expected a JSON object with a \"text\" string and optional \"model\" "
+                                                   f"and \"direction\" strings: {e}"})
+                    return
+                try:
+                    translation, shared = service.translate(text, model, direction)
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                except requests.exceptions.RequestException as e:
+                    self._send_json(502, {"error": f"Ollama request failed: {e}"})
+                except Exception as e:
+                    # Whatever went wrong, the client gets an answer
+                    import traceback
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                    self._send_json(500, {"error": f"Translation failed: {e}"})
+                else:
+                    self._send_json(200, {"translation": translation, "shared": shared,
+                                          "model": model or service.default_model(),
+                                          "direction": direction or service.direction})
+
+        return Handler
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve translations with a local Ollama model over HTTP.")
+    parser.add_argument("-m", "--model", required=True, help="Default Ollama model name, e.g. llama3:latest")
+    parser.add_argument("-d", "--direction", default="de-en", choices=DIRECTIONS, help="Default translation direction (default: de-en)")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"Address to listen on (default: {SERVICE_HOST})")
+    parser.add_argument("-p", "--port", type=int, default=SERVICE_PORT or DEFAULT_SERVICE_PORT,
+                        help=f"Port to listen on (default: {SERVICE_PORT or DEFAULT_SERVICE_PORT})")
+    parser.add_argument("--batch-window-ms", type=int, default=BATCH_WINDOW_MS,
+                        help=f"How long short requests wait to be batched together (default: {BATCH_WINDOW_MS})")
+    parser.add_argument("--keep-alive", default=MODEL_KEEP_ALIVE,
+                        help=f"How long the model stays loaded after the last request (default: {MODEL_KEEP_ALIVE})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the translation memory")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    get_endpoint_pool().refresh()
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = TranslationCache()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Translation cache disabled: {e}", file=sys.stderr)
+    service = TranslationService(args.model, args.direction, cache, args.keep_alive, MetricsRecorder(),
+                                 batch_window=args.batch_window_ms / 1000)
+    host, port = service.serve(args.host, args.port)
+    print(f"Serving translations with {args.model} on http://{host}:{port}/translate (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        print(f"Served: {service.health()['stats']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
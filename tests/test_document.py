@@ -0,0 +1,230 @@
+import re
+import unittest
+from collections import deque
+
+import tkinter as tk
+
+import ollama_translator_core as core
+import ollama_translator_gui as gui
+
+MODEL, DIRECTION = "test:latest", "de-en"
+
+def fake_translation(segment):
+    return segment.upper()
+
+def translated_document(text):
+    document = core.TranslationDocument(MODEL, DIRECTION, text)
+    document.translations = [fake_translation(segment) for segment, _ in document.segments]
+    return document
+
+class DiffTest(unittest.TestCase):
+    def test_unchanged_text_reuses_everything(self):
+        previous = translated_document("Eins.\n\nZwei.\n\nDrei.")
+        document, opcodes = previous.diff("Eins.\n\nZwei.\n\nDrei.")
+        self.assertEqual(opcodes, [('equal', 0, 3, 0, 3)])
+        self.assertEqual(document.pending(), [])
+        self.assertEqual(document.text(), previous.text())
+
+    def test_changed_paragraph_is_pending(self):
+        previous = translated_document("Eins.\n\nZwei.\n\nDrei.")
+        document, opcodes = previous.diff("Eins.\n\nZwei neu.\n\nDrei.")
+        self.assertEqual(opcodes, [('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2), ('equal', 2, 3, 2, 3)])
+        self.assertEqual(document.pending(), [1])
+        self.assertEqual(document.translations[0], "EINS.")
+        self.assertEqual(document.translations[2], "DREI.")
+
+    def test_inserted_paragraph(self):
+        previous = translated_document("Eins.\n\nDrei.")
+        document, opcodes = previous.diff("Eins.\n\nZwei.\n\nDrei.")
+        self.assertEqual(opcodes, [('equal', 0, 1, 0, 1), ('insert', 1, 1, 1, 2), ('equal', 1, 2, 2, 3)])
+        self.assertEqual(document.pending(), [1])
+
+    def test_moved_paragraph_keeps_its_translation(self):
+        previous = translated_document("Eins.\n\nZwei.\n\nDrei.")
+        document, opcodes = previous.diff("Drei.\n\nEins.\n\nZwei.")
+        self.assertNotEqual(opcodes, [('equal', 0, 3, 0, 3)])
+        self.assertEqual(document.pending(), [])
+        self.assertEqual(document.text(), "DREI.\n\nEINS.\n\nZWEI.")
+
+    def test_separator_only_change_keeps_the_translation(self):
+        previous = translated_document("Eins.\n\nZwei.")
+        document, opcodes = previous.diff("Eins.\n\n\n\nZwei.")
+        self.assertEqual(opcodes[0][0], 'replace')
+        self.assertEqual(document.pending(), [])
+        self.assertEqual(document.text(), "EINS.\n\n\n\nZWEI.")
+
+    def test_whitespace_segments_are_their_own_translation(self):
+        previous = translated_document("Eins.")
+        document, _ = previous.diff("  \n\nEins.")
+        self.assertEqual(document.segments[0], ("  ", "\n\n"))
+        self.assertEqual(document.translations[0], "  ")
+        self.assertEqual(document.pending(), [])
+
+class FakeText:
+    """Just enough of a Tk Text widget for the patching code, including mark gravity."""
+    INDEX_RE = re.compile(r'(\S+?)(?:-1c)?(?: ([+-]) (\d+) chars)?$')
+
+    def __init__(self):
+        self.text = ""
+        self.marks = {} # name -> [offset, gravity]
+
+    def index(self, index):
+        return f"1.0 + {self._offset(index)} chars"
+
+    def _offset(self, index):
+        match = self.INDEX_RE.match(index)
+        base = match.group(1)
+        offset = 0 if base == "1.0" else len(self.text) if base == "end" else self.marks[base][0]
+        amount = int(match.group(3) or 0)
+        return offset - amount if match.group(2) == "-" else offset + amount
+
+    def get(self, start, end):
+        return self.text[self._offset(start):self._offset(end)]
+
+    def insert(self, index, text, tags=()):
+        position = self._offset(index)
+        self.text = self.text[:position] + text + self.text[position:]
+        for mark in self.marks.values():
+            if mark[0] > position or (mark[0] == position and mark[1] == "right"):
+                mark[0] += len(text)
+
+    def delete(self, start, end=None):
+        start = self._offset(start)
+        end = self._offset(end) if end is not None else start + 1
+        self.text = self.text[:start] + self.text[end:]
+        for mark in self.marks.values():
+            mark[0] = start if start < mark[0] <= end else mark[0] - (end - start) if mark[0] > end else mark[0]
+
+    def mark_set(self, name, index):
+        position = self._offset(index)
+        self.marks.setdefault(name, [0, "right"])[0] = position
+
+    def mark_gravity(self, name, gravity):
+        self.marks[name][1] = gravity
+
+    def mark_unset(self, *names):
+        for name in names:
+            self.marks.pop(name, None)
+
+    def compare(self, first, op, second):
+        return {"==": int.__eq__, "<": int.__lt__, ">": int.__gt__}[op](self._offset(first), self._offset(second))
+
+    def config(self, **options):
+        pass
+
+    def see(self, index):
+        pass
+
+class PatchTest(unittest.TestCase):
+    # Drives OllamaTranslatorApp._prepare_patch and _flush_output on a Text
+    # widget and checks that the result is the new document's text
+
+    def make_widget(self):
+        return FakeText()
+
+    def make_app(self, previous):
+        app = object.__new__(gui.OllamaTranslatorApp)
+        app.output_text = self.make_widget()
+        app.output_text.insert("1.0", previous.text())
+        app._output_document = previous
+        app._patch_marks = set()
+        app._patching = True
+        app._drafting = False
+        app._drawn_output = {}
+        app.display_job = core.TranslationJob("test", None, priority=core.PRIORITY_INTERACTIVE)
+        app.display_job.output = deque()
+        return app
+
+    def stream(self, app, document, draft=False):
+        # The pending segments arrive in small pieces, interleaved as concurrent workers would send them
+        pending = document.pending()
+        pieces = {}
+        for index in pending:
+            translation = fake_translation(document.segments[index][0])
+            pieces[index] = [translation[start:start + 7] for start in range(0, len(translation), 7)]
+        output = app.display_job.output
+        while any(pieces.values()):
+            for index in pending:
+                if pieces[index]:
+                    output.append((index, pieces[index].pop(0).lower() if draft else pieces[index].pop(0)))
+            app._flush_output()
+        for index in reversed(pending): # Finished out of order
+            translation = fake_translation(document.segments[index][0])
+            if draft:
+                output.append((index, translation, True))
+            document.translations[index] = translation
+        app._flush_output()
+
+    def check(self, old_text, new_text, draft=False):
+        previous = translated_document(old_text)
+        document, opcodes = previous.diff(new_text)
+        app = self.make_app(previous)
+        app._drafting = draft
+        app._prepare_patch(document, previous, opcodes)
+        self.stream(app, document, draft)
+        self.assertTrue(document.complete())
+        self.assertEqual(app.output_text.get("1.0", "end-1c"), document.text())
+
+    def test_changed_and_inserted_paragraphs(self):
+        self.check("Eins zwei.\n\nDrei vier.\n\nFünf sechs.\n\nSieben.",
+                   "Eins zwei.\n\nDrei VIER neu.\n\nNeuer Absatz hier.\n\n\n\nFünf sechs.\n\nSieben.")
+
+    def test_removed_and_moved_paragraphs(self):
+        self.check("Eins.\n\nZwei.\n\nDrei.\n\nVier.", "Vier.\n\nEins neu.\n\nDrei.")
+
+    def test_changed_first_and_last_paragraphs(self):
+        self.check("Eins.\n\nZwei.\n\nDrei.", "Eins anders.\n\nZwei.\n\nDrei anders.")
+
+    def test_draft_is_replaced_by_refined_translation(self):
+        self.check("Eins zwei.\n\nDrei vier.\n\nFünf.", "Eins zwei drei.\n\nDrei vier.\n\nFünf sechs sieben.",
+                   draft=True)
+
+    def test_segments_without_separator(self):
+        # A word longer than a segment is cut without a separator, so one
+        # segment's end mark shares its index with the next one's start mark
+        long_word = "x" * (core.MAX_SEGMENT_CHARS * 2 + 10)
+        new_text = f"Eins.\n\n{long_word} Ende."
+        self.assertIn("", [separator for _, separator in core.split_into_segments(new_text)[:-1]])
+        self.check("Eins.\n\nZwei.", new_text)
+        self.check("Eins.\n\nZwei.", new_text, draft=True)
+
+    def test_changed_piece_of_a_cut_paragraph(self):
+        size = core.MAX_SEGMENT_CHARS
+        old_text = "a" * size + "b" * size + "c" * 10 + "\n\nEnde."
+        self.check(old_text, old_text.replace("b" * size, "d" * size))
+        self.check(old_text, old_text.replace("b" * size, "d" * size), draft=True)
+        # The changed piece and a known one with a new separator form one replaced range
+        new_text = old_text.replace("b" * size, "d" * size).replace("\n\nEnde", "\n\n\n\nEnde")
+        self.check(old_text, new_text)
+        self.check(old_text, new_text, draft=True)
+
+    def test_rebuild_when_the_shown_text_is_not_the_previous_document(self):
+        previous = translated_document("Eins.\n\nZwei.\n\nDrei.")
+        document, opcodes = previous.diff("Eins.\n\nZwei neu.\n\nDrei.")
+        app = self.make_app(previous)
+        app._output_document = None
+        app.output_text.insert("end", "something else")
+        app._prepare_patch(document, previous, opcodes)
+        self.stream(app, document)
+        self.assertEqual(app.output_text.get("1.0", "end-1c"), document.text())
+
+class TkPatchTest(PatchTest):
+    # The same checks on a real Text widget, where a display is available
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.root = tk.Tk()
+        except tk.TclError as e:
+            raise unittest.SkipTest(f"no display: {e}")
+        cls.root.withdraw()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.destroy()
+
+    def make_widget(self):
+        return tk.Text(self.root)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import ollama_translator_core as core
+
+class TextTailTest(unittest.TestCase):
+    def drain(self, queue):
+        text = []
+        while queue:
+            text.append(queue.popleft())
+        return "".join(text)
+
+    def test_keeps_the_last_characters_of_large_pieces(self):
+        job = core.TranslationJob("file", None, output_limit=100)
+        for index in range(50):
+            job.output.append(f"Segment {index} " * 20)
+        tail = self.drain(job.output)
+        self.assertLessEqual(len(tail), 100)
+        self.assertTrue(tail.endswith("Segment 49 "))
+
+    def test_small_pieces_are_kept_until_the_limit(self):
+        queue = core.TextTail(10)
+        for piece in "abcdefghijkl":
+            queue.append(piece)
+        self.assertEqual(self.drain(queue), "cdefghijkl")
+        queue.append("x")
+        self.assertEqual(self.drain(queue), "x")
+
+    def test_jobs_without_limit_keep_everything(self):
+        job = core.TranslationJob("text", None)
+        for index in range(1000):
+            job.output.append("Segment ")
+        self.assertEqual(len(self.drain(job.output)), 8000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import ollama_translator_core as core
+
+URL = "https://example.com/a?b=1"
+
+class MaskTest(unittest.TestCase):
+    def assertRoundTrip(self, segment):
+        masked, spans = core.mask_segment(segment)
+        self.assertEqual(core.unmask(masked, spans), segment)
+        return masked, spans
+
+    def test_spans_are_masked_and_restored(self):
+        masked, spans = self.assertRoundTrip(f"Siehe {URL}, `pip install x` und mail@example.org.")
+        self.assertEqual(masked, "Siehe {{1}}, {{2}} und {{3}}.")
+        self.assertEqual(spans, [URL, "`pip install x`", "mail@example.org"])
+
+    def test_markup_numbers_and_dates(self):
+        masked, spans = self.assertRoundTrip("Am 2024-01-02 kam <em>Version</em> 1.12.30 &amp; mehr.")
+        self.assertIn("2024-01-02", spans)
+        self.assertIn("1.12.30", spans)
+        self.assertNotIn("2024-01-02", masked)
+
+    def test_short_spans_are_left_alone(self):
+        masked, spans = self.assertRoundTrip("Es sind 42 Tage.")
+        self.assertEqual((masked, spans), ("Es sind 42 Tage.", []))
+
+    def test_text_that_looks_like_a_placeholder_is_masked_too(self):
+        masked, spans = self.assertRoundTrip("Schreibe {{1}} hierhin.")
+        self.assertEqual((masked, spans), ("Schreibe {{1}} hierhin.", ["{{1}}"]))
+
+    def test_invented_placeholders_are_kept(self):
+        self.assertEqual(core.unmask("{{1}} und {{7}}", [URL]), f"{URL} und {{{{7}}}}")
+
+    def test_untranslatable(self):
+        self.assertTrue(core.is_untranslatable(core.mask_segment("```\nprint(1)\n```")[0]))
+        self.assertTrue(core.is_untranslatable(core.mask_segment(f"{URL} - 2024-01-02")[0]))
+        self.assertFalse(core.is_untranslatable(core.mask_segment(f"Siehe {URL}")[0]))
+
+class PlaceholderRestorerTest(unittest.TestCase):
+    def restore(self, pieces, spans):
+        restorer = core.PlaceholderRestorer(spans)
+        return "".join(restorer.feed(piece) for piece in pieces) + restorer.flush(), restorer
+
+    def test_placeholder_split_at_every_position(self):
+        text = "Siehe {{1}} und {{2}}."
+        for cut in range(1, len(text)):
+            for second in range(cut + 1, len(text)):
+                pieces = [text[:cut], text[cut:second], text[second:]]
+                restored, restorer = self.restore(pieces, [URL, "`x`"])
+                self.assertEqual(restored, f"Siehe {URL} und `x`.", pieces)
+                self.assertEqual(restorer.missing(), 0)
+
+    def test_one_character_pieces(self):
+        restored, restorer = self.restore(list("A {{1}}{{2}} B"), ["x", "y"])
+        self.assertEqual(restored, "A xy B")
+
+    def test_held_back_text_that_is_no_placeholder(self):
+        restored, restorer = self.restore(["Menge {", "a} und {{", "9"], [URL])
+        self.assertEqual(restored, "Menge {a} und {{9")
+        self.assertEqual(restorer.missing(), 1)
+
+    def test_missing_placeholders_are_counted(self):
+        restored, restorer = self.restore(["Siehe ", "{{2}}."], [URL, "`x`"])
+        self.assertEqual(restored, "Siehe `x`.")
+        self.assertEqual(restorer.missing(), 1)
+
+class TranslateSegmentMaskingTest(unittest.TestCase):
+    # translate_segment with the HTTP request replaced by a canned reply
+
+    def translate(self, segment, reply, cache):
+        endpoint = SimpleNamespace(url="http://stub/api")
+        pool = mock.Mock(endpoints=[endpoint])
+        pool.acquire.return_value = endpoint
+        model_info = mock.Mock()
+        model_info.request_options.return_value = {}
+        requests_sent = []
+
+        def stream(base_url, path, payload, parts, on_text, controller, metrics, prompt_tokens):
+            requests_sent.append(payload)
+            for piece in reply:
+                parts.append(piece)
+                on_text(piece)
+            return True
+
+        streamed = []
+        with mock.patch.object(core, "MASK_SPANS", True), \
+                mock.patch.object(core, "get_endpoint_pool", return_value=pool), \
+                mock.patch.object(core, "get_model_info", return_value=model_info), \
+                mock.patch.object(core, "_stream_generate", stream):
+            translation = core.translate_segment("test:latest", "de-en", "prefix", segment, streamed.append,
+                                                 core.AbortController(), cache)
+        return translation, "".join(streamed), requests_sent
+
+    def setUp(self):
+        self.cache = core.TranslationCache(":memory:")
+
+    def test_placeholders_are_restored_and_cached(self):
+        segment = f"Siehe {URL} jetzt."
+        translation, streamed, sent = self.translate(segment, ["See {", "{1", "}} now."], self.cache)
+        self.assertEqual(translation, f"See {URL} now.")
+        self.assertEqual(streamed, translation)
+        self.assertIn("Siehe {{1}} jetzt.", json.dumps(sent[0]))
+        self.assertNotIn(URL, json.dumps(sent[0]))
+        self.assertEqual(self.cache.get("test:latest", "de-en", "prefix", segment), translation)
+
+    def test_lost_placeholders_are_not_cached(self):
+        segment = f"Siehe {URL} jetzt."
+        translation, streamed, _ = self.translate(segment, ["See it ", "now."], self.cache)
+        self.assertEqual(translation, "See it now.")
+        self.assertEqual(streamed, translation)
+        self.assertIsNone(self.cache.get("test:latest", "de-en", "prefix", segment))
+
+    def test_untranslatable_segment_is_not_sent(self):
+        segment = "```\nprint(1)\n```"
+        translation, streamed, sent = self.translate(segment, ["nope"], self.cache)
+        self.assertEqual((translation, streamed, sent), (segment, segment, []))
+
+if __name__ == "__main__":
+    unittest.main()
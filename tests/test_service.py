@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+
+import ollama_translator_core as core
+from ollama_translator_service import MicroBatcher, SingleFlight
+
+def run_threads(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        def follow(index):
+            while not calls: # The leader is in its call
+                time.sleep(0.001)
+            threading.Timer(0.05, release.set).start()
+            return flight.do("key", work)
+
+        leader = []
+        thread = threading.Thread(target=lambda: leader.append(flight.do("key", work)))
+        thread.start()
+        results, errors = run_threads(5, follow)
+        thread.join(5)
+        self.assertEqual(leader, [("result", False)])
+        self.assertEqual(calls, [1])
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(results, [("result", True)] * 5)
+
+    def test_errors_reach_every_caller_and_free_the_key(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError("boom")
+
+        def call(index):
+            if index:
+                started.wait(5)
+            return flight.do("key", fail)
+
+        _, errors = run_threads(3, call)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors), errors)
+        self.assertEqual(flight.do("key", lambda: "again"), ("again", False))
+
+    def test_different_keys_do_not_wait_for_each_other(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), (1, False))
+        self.assertEqual(flight.do("b", lambda: 2), (2, False))
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_items_within_the_window_share_a_batch(self):
+        batches = []
+
+        def run_batch(key, items):
+            batches.append((key, list(items)))
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(run_batch, window=0.2, max_items=10)
+        results, errors = run_threads(4, lambda index: batcher.submit("key", f"text {index}"))
+        self.assertEqual(errors, [None] * 4)
+        self.assertEqual(results, [f"TEXT {index}" for index in range(4)])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(sorted(batches[0][1]), [f"text {index}" for index in range(4)])
+
+    def test_a_full_batch_runs_at_once(self):
+        batches = []
+
+        def run_batch(key, items):
+            batches.append(list(items))
+            return items
+
+        batcher = MicroBatcher(run_batch, window=30, max_items=3)
+        started = time.perf_counter()
+        results, errors = run_threads(3, lambda index: batcher.submit("key", index))
+        self.assertLess(time.perf_counter() - started, 5)
+        self.assertEqual(results, [0, 1, 2])
+        self.assertEqual([len(batch) for batch in batches], [3])
+
+    def test_keys_are_batched_separately(self):
+        batches = []
+
+        def run_batch(key, items):
+            batches.append((key, sorted(items)))
+            return [f"{key}:{item}" for item in items]
+
+        batcher = MicroBatcher(run_batch, window=0.1, max_items=10)
+        results, _ = run_threads(4, lambda index: batcher.submit(index % 2, index))
+        self.assertEqual(results, ["0:0", "1:1", "0:2", "1:3"])
+        self.assertEqual(sorted(batches), [(0, [0, 2]), (1, [1, 3])])
+
+    def test_a_failed_batch_fails_every_item(self):
+        def run_batch(key, items):
+            raise RuntimeError("model gone")
+
+        batcher = MicroBatcher(run_batch, window=0.05, max_items=10)
+        _, errors = run_threads(3, lambda index: batcher.submit("key", index))
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors), errors)
+
+class SplitBatchTranslationTest(unittest.TestCase):
+    def test_numbered_pieces(self):
+        self.assertEqual(core._split_batch_translation("[1] Hello.\n[2] Good morning!\n[3] Bye.", 3),
+                         ["Hello.", "Good morning!", "Bye."])
+
+    def test_multi_line_piece(self):
+        self.assertEqual(core._split_batch_translation("[1] One\nline two\n[2] Two", 2), ["One\nline two", "Two"])
+
+    def test_missing_marker(self):
+        self.assertIsNone(core._split_batch_translation("[1] Hello.\n[3] Bye.", 3))
+        self.assertIsNone(core._split_batch_translation("[1] Hello. [2] Bye.", 3))
+
+    def test_markers_out_of_order(self):
+        self.assertIsNone(core._split_batch_translation("[2] Bye.\n[1] Hello.", 2))
+
+    def test_text_before_the_first_marker(self):
+        self.assertIsNone(core._split_batch_translation("Here you go:\n[1] Hello.", 1))
+
+if __name__ == "__main__":
+    unittest.main()